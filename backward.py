@@ -1,4 +1,28 @@
-import uuid
+import concurrent.futures as cf
+import numpy as np
+import store as st
+
+# Store solver shared by the tasks of a worker process
+shared = None
+
+def initialize(instance):
+    """
+        Create the solver shared by the tasks of a worker process (instance data is sent once per worker)
+    """
+
+    global shared
+
+    shared = Backward(instance)
+
+def evaluate(k, x, following):
+    """
+        Compute Q_k(x,u) for all feasible actions u at state x within a worker process
+    """
+
+    # Only J_{k+1} values are needed to compute Q_k(x,u)
+    shared.stored_J[k + 1] = following
+
+    return [shared.Q(k, x, u) for u in shared.I.U(x)]
 
 class Backward:
 
@@ -14,60 +38,85 @@ class Backward:
         # Store \mu_k(x) values
         self.stored_u = {}
 
-    def run_solver(self, verbose = False):
+    def run_solver(self, verbose = False, workers = 1):
         """
             Solve the problem instance with Backward solver
+            (Q_k(x,u) values are spread over a pool of processes if workers > 1)
         """
 
         print('Running backward solver')
 
-        # Loop over planning stages
-        for k in reversed(self.I.K):
+        pool = None
 
-            self.stored_J[k] = {}
-            self.stored_u[k] = {}
+        if workers > 1:
+            print('Spreading computations over {} worker processes'.format(workers))
+            pool = cf.ProcessPoolExecutor(workers, initializer = initialize, initargs = (self.I,))
 
-            if verbose:
-                print('\tStage {}'.format(k))
+        # Shut the pool down even if some task fails, cancelling the tasks not started yet
+        try:
 
-            # Loop over feasible states
-            for x in self.I.X:
+            # Loop over planning stages
+            for k in reversed(self.I.K):
 
-                if k == self.I.N:
+                self.stored_J[k] = {}
+                self.stored_u[k] = {}
 
-                    # Compute g_N(x) if at stage k = N
+                if verbose:
+                    print('\tStage {}'.format(k))
 
-                    y = [x] if x != self.I.empty else []
+                if pool is not None and k != self.I.N:
 
-                    self.stored_J[k][x] = self.I.m(k, y)
-                    self.stored_u[k][x] = -1
+                    # Submit one task per feasible state, all of them reading J_{k+1} values only
+                    futures = { x : pool.submit(evaluate, k, x, self.stored_J[k + 1]) for x in self.I.X }
 
-                else:
+                    # Wait for all tasks of stage k before moving to stage k - 1
+                    computed = { x : future.result() for x, future in futures.items() }
 
-                    if verbose:
-                        print('\t\tState {}'.format(x))
+                # Loop over feasible states
+                for x in self.I.X:
 
-                    # Compute optimal Q_k(x,u) k < N
+                    if k == self.I.N:
 
-                    U = self.I.U(x)
+                        # Compute g_N(x) if at stage k = N
 
-                    minimum = self.Q(k, x, U[0])
-                    action = U[0]
+                        y = [x] if x != self.I.empty else []
 
-                    # Loop over feasible actions
-                    for u in U:
+                        self.stored_J[k][x] = self.I.m(k, y)
+                        self.stored_u[k][x] = -1
 
-                        local = self.Q(k, x, u)
+                    else:
 
                         if verbose:
-                            print('\t\t\tAction {} -> Q_{}({}, {}) = {}'.format(u, k, x, u, round(local, 2)))
+                            print('\t\tState {}'.format(x))
+
+                        # Compute optimal Q_k(x,u) k < N
+
+                        U = self.I.U(x)
+
+                        if pool is not None:
+                            values = computed[x]
+                        else:
+                            values = [self.Q(k, x, u) for u in U]
 
-                        if local < minimum:
-                            minimum = local
-                            action = u
+                        minimum = values[0]
+                        action = U[0]
 
-                    self.stored_J[k][x] = minimum
-                    self.stored_u[k][x] = action
+                        # Loop over feasible actions
+                        for u, local in zip(U, values):
+
+                            if verbose:
+                                print('\t\t\tAction {} -> Q_{}({}, {}) = {}'.format(u, k, x, u, round(local, 2)))
+
+                            if local < minimum:
+                                minimum = local
+                                action = u
+
+                        self.stored_J[k][x] = minimum
+                        self.stored_u[k][x] = action
+
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures = True)
 
     def Q(self, k, x, u):
         """
@@ -82,22 +131,15 @@ class Backward:
         # Compute the deterministic term
         cost = self.I.m(k, y)
 
-        # Compute the exoectation term
-        for w in self.I.W[k]:
-
-            p = self.I.p(k, w, y)
-
-            if p > 0.0001:
-
-                y_next = self.I.f(y, u, w)
+        # Retrieve the expectation record of state x and action u
+        record = self.I.expectation(k, x, u)
 
-                x_next = self.I.empty if len(y_next) == 0 else y_next[0]
-
-                # Compute the estimated revenue for the realization w
-                cost -= p * self.I.r(y_next, w) # + self.I.t(x, x_next)
+        # Compute the exoectation term
+        cost -= record['revenue'] # + self.I.t(x, x_next)
 
-                # Weight optimal cost-to-go values until the end
-                cost += p * self.stored_J[k + 1][x_next]
+        # Weight optimal cost-to-go values until the end
+        for x_next, p in record['transition'].items():
+            cost += p * self.stored_J[k + 1][x_next]
 
         return cost
 
@@ -125,23 +167,8 @@ class Backward:
 
                     print('\t\tAt state {}, take action {}'.format(x, self.stored_u[k][x]))
 
-                    transition = {}
-
-                    for x_next in self.I.X:
-
-                        transition[x_next] = .0
-
-                    for w in self.I.W[k]:
-
-                        y = [x] if x != self.I.empty else []
-
-                        y_next = self.I.f(y, self.stored_u[k][x], w)
-
-                        x_next = self.I.empty if len(y_next) == 0 else y_next[0]
-
-                        p = self.I.p(k, w, y)
-
-                        transition[x_next] += p
+                    # Retrieve next-state distribution from the expectation record
+                    transition = self.I.expectation(k, x, self.stored_u[k][x])['transition']
 
                     for x_next, p in transition.items():
 
@@ -160,9 +187,7 @@ class Backward:
 
         print('Exporting backward policy')
 
-        with open('policies/backward_{}_{}_{}_{}.txt'.format(self.I.name, self.I.s, self.I.d, str(uuid.uuid4())[:8]),'w') as output:
-
-            output.write('{}'.format(self.stored_u))
+        st.Store().save('backward', self.I, self.stored_u, stored_J = self.stored_J)
 
     def print_summary(self, k = 0):
         """
@@ -172,6 +197,9 @@ class Backward:
         for x in self.I.X:
             print('\tThe expected profit J_{}({}) is {}'.format(k, x, self.J(k, x)))
 
+        if k != self.I.N:
+            print('\tThe probability mass dropped by pruning at stage {} is at most {}'.format(k, max([self.I.dropped(k, x) for x in self.I.X])))
+
     def evaluate_policy(self, policy):
         """
             Evaluate some policy according to the information stored locally
@@ -203,4 +231,61 @@ class Backward:
                     # Apply policy provided as argument instead of minimizing over feasible actions
                     evaluated_J[k][x] = self.Q(k, x, policy[k][x])
 
-        return evaluated_J
\ No newline at end of file
+        return evaluated_J
+
+    def matrices(self, k):
+        """
+            Build the maintenance vector, revenue matrix |X| x |L|, and transition tensor |X| x |L| x |X| for stage k
+            (entries are taken from the expectation records, for all states x and actions u)
+        """
+
+        maintenance = np.array([self.I.m(k, [x] if x != self.I.empty else []) for x in self.I.X])
+
+        if k == self.I.N:
+            return maintenance, None, None
+
+        revenue = np.zeros((len(self.I.X), len(self.I.L)))
+        transition = np.zeros((len(self.I.X), len(self.I.L), len(self.I.X)))
+
+        for x_index, x in enumerate(self.I.X):
+            for u_index, u in enumerate(self.I.L):
+
+                record = self.I.expectation(k, x, u)
+
+                revenue[x_index, u_index] = record['revenue']
+
+                for x_next, p in record['transition'].items():
+                    transition[x_index, u_index, self.I.states[x_next]] = p
+
+        return maintenance, revenue, transition
+
+    def evaluate_policies(self, policies):
+        """
+            Evaluate several policies at once according to the information stored locally
+            (the result is an array indexed by [policy, k, x] with the same values as evaluate_policy)
+        """
+
+        evaluated_J = np.zeros((len(policies), len(self.I.K), len(self.I.X)))
+
+        states = np.arange(len(self.I.X))
+
+        for k in reversed(self.I.K):
+
+            maintenance, revenue, transition = self.matrices(k)
+
+            if k == self.I.N:
+
+                evaluated_J[:, k, :] = maintenance
+
+            else:
+
+                # Retrieve the action taken at every state x by every policy, shape P x |X|
+                actions = np.array([[self.I.index[policy[k][x]] for x in self.I.X] for policy in policies], dtype = int).reshape(len(policies), len(self.I.X))
+
+                # Retrieve optimal cost-to-go values J_{k+1}(x) stored locally
+                following = np.array([self.stored_J[k + 1][x] for x in self.I.X])
+
+                # Apply policies provided as argument instead of minimizing over feasible actions
+                evaluated_J[:, k, :] = maintenance - revenue[states, actions] + transition[states, actions] @ following
+
+        return evaluated_J
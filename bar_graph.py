@@ -4,33 +4,36 @@ import numpy as np
 import argparse as ag
 import instance as it
 import backward as bd
-import ast
-import os
+import cache as ch
+import store as st
 
 # Parse arguments using argparse
 parser = ag.ArgumentParser(description = 'Draw bar graph comparing the parametric policy with the backward policy for some instance')
 parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
 parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples (0 means full enumeration)', default = 0)
+parser.add_argument('--strategy', type = str, choices = ['uniform', 'stratified', 'importance'], help = 'Set sampling strategy of the stored policies to evaluate', default = 'uniform')
 parser.add_argument('-d', '--decay', type = int, help = 'Set rationality decay parameter (1 means fully rational)', default = 1)
+parser.add_argument('--seed', type = int, help = 'Set seed of the random generator used for sampling (default is unseeded)', default = None)
+parser.add_argument('--cache', action = 'store_true', help = 'Load the reference solution from the solution cache (or save it there)', default = False)
 arguments = parser.parse_args()
 
 # Create problem object with arguments
-problem = it.Instance(arguments.folder, arguments.samples, arguments.decay)
+problem = it.Instance(arguments.folder, arguments.samples, arguments.decay, arguments.seed)
 
 # Create reference solver and run it
 reference = bd.Backward(problem)
-reference.run_solver()
+if arguments.cache:
+    ch.Cache().solve('backward', reference)
+else:
+    reference.run_solver()
 
 # Retrieve parametric policy
 policy = {}
-pattern = '{}_{}_{}_{}'.format('parametric', problem.name, arguments.samples, arguments.decay)
-print('Looking for stored policy with pattern {}'.format(pattern))
-for file in os.listdir('policies'):
-    if pattern in file:
-        print('\tFound policy {}'.format(file))
-        with open('policies/{}'.format(file)) as output:
-            content = output.read()
-        policy = ast.literal_eval(content)
+store = st.Store()
+print('Looking for stored policy with keys {}'.format(('parametric', problem.name, arguments.samples, arguments.decay, arguments.strategy)))
+for entry in store.entries('parametric', problem.name, arguments.samples, arguments.decay, arguments.strategy):
+    print('\tFound policy {}'.format(entry['file']))
+    policy = store.load(entry)['u']
 
 # Create list to store optimal J_0(x) values (i.e., from backward policy)
 optimal_J = []
@@ -0,0 +1,174 @@
+import argparse as ag
+import tracemalloc as tr
+import generator as gn
+import instance as it
+import backward as bd
+import parametric as pd
+import time as tm
+import csv
+import sys
+import os
+
+# Store fields of every row of the results file
+fields = ['locations', 'customers', 'stages', 'samples', 'seed', 'step', 'seconds', 'megabytes']
+
+# Store fields that identify a measurement when comparing with a baseline
+keys = ['locations', 'customers', 'stages', 'samples', 'seed', 'step']
+
+def measure(step, memory, function, *arguments):
+    """
+        Run some function and measure its elapsed time and (optionally) the peak memory it allocates
+    """
+
+    if memory:
+        tr.start()
+
+    start = tm.perf_counter()
+    result = function(*arguments)
+    seconds = tm.perf_counter() - start
+
+    megabytes = ''
+    if memory:
+        megabytes = tr.get_traced_memory()[1] / 2**20
+        tr.stop()
+
+    print('>>> Step {} took {} seconds'.format(step, round(seconds, 4)))
+
+    return result, seconds, megabytes
+
+def cold(problem):
+    """
+        Discard every table, record, and feature matrix cached by the instance, so the next step starts cold
+    """
+
+    problem.reset()
+    problem.batches = {}
+
+def steps(path, samples, decay, seed, solvers, memory):
+    """
+        Measure every step of the solvers on the instance within some folder (returns step names, seconds, and megabytes)
+        (caches of the instance are discarded before every step, so no step reuses the work of a previous one)
+    """
+
+    measured = []
+
+    problem, seconds, megabytes = measure('instance', memory, it.Instance, path, samples, decay, seed)
+    measured.append(('instance', seconds, megabytes))
+
+    reference = bd.Backward(problem)
+    cold(problem)
+    _, seconds, megabytes = measure('backward', memory, reference.run_solver)
+    measured.append(('backward', seconds, megabytes))
+
+    policy = reference.stored_u
+
+    if 'parametric' in solvers:
+
+        parametric_solver = pd.Parametric(problem)
+        cold(problem)
+        _, seconds, megabytes = measure('train', memory, parametric_solver.train_solver)
+        measured.append(('train', seconds, megabytes))
+        cold(problem)
+        _, seconds, megabytes = measure('parametric', memory, parametric_solver.run_solver)
+        measured.append(('parametric', seconds, megabytes))
+
+        policy = parametric_solver.stored_u
+
+    # Evaluate the parametric policy (or the backward policy alone) with exact expectations
+    cold(problem)
+    _, seconds, megabytes = measure('evaluate', memory, reference.evaluate_policy, policy)
+    measured.append(('evaluate', seconds, megabytes))
+
+    return measured
+
+def benchmark(folder, locations, customers, stages, samples, seed, decay, solvers, memory):
+    """
+        Generate a seeded instance and measure every step of the solvers on it (returns rows of the results file)
+        (peak memory is measured in a second pass, since tracing allocations slows down the steps)
+    """
+
+    path = os.path.join(folder, 'instances', '{}_{}_{}_{}'.format(locations, customers, stages, seed))
+    gn.generate(path, locations, customers, stages, seed)
+
+    timed = steps(path, samples, decay, seed, solvers, False)
+    traced = steps(path, samples, decay, seed, solvers, True) if memory else [(step, None, '') for step, _, _ in timed]
+
+    return [[locations, customers, stages, samples, seed, step, seconds, megabytes] for (step, seconds, _), (_, _, megabytes) in zip(timed, traced)]
+
+def compare(rows, baseline_path, tolerance):
+    """
+        Compare measurements with those of a baseline results file (returns the number of regressions)
+    """
+
+    with open(baseline_path, newline = '') as content:
+        baseline = { tuple(row[field] for field in keys) : row for row in csv.DictReader(content) }
+
+    print('Comparing with baseline {}'.format(baseline_path))
+
+    regressions = 0
+
+    for row in rows:
+
+        measured = dict(zip(fields, [str(value) for value in row]))
+        previous = baseline.get(tuple(measured[field] for field in keys))
+
+        if previous is None:
+            print('\t{}: no baseline measurement'.format(' '.join(measured[field] for field in keys)))
+            continue
+
+        ratio = float(measured['seconds']) / max(float(previous['seconds']), 1e-9)
+
+        # Ignore differences under 10 milliseconds, which are mostly noise
+        regressed = ratio > 1 + tolerance and float(measured['seconds']) - float(previous['seconds']) > .01
+        regressions += regressed
+
+        print('\t{}: {} seconds against {} seconds (x{}){}'.format(' '.join(measured[field] for field in keys), round(float(measured['seconds']), 4), round(float(previous['seconds']), 4), round(ratio, 2), ' <<< regression' if regressed else ''))
+
+    print('Found {} regressions beyond a tolerance of {}%'.format(regressions, round(100 * tolerance)))
+
+    return regressions
+
+if __name__ == '__main__':
+
+    # Parse arguments using argparse
+    parser = ag.ArgumentParser(description = 'Benchmark the solvers over a grid of seeded random instances')
+    parser.add_argument('--locations', type = int, nargs = '+', help = 'Set numbers of locations |L|', default = [6, 8, 10])
+    parser.add_argument('--customers', type = int, nargs = '+', help = 'Set numbers of customers |C|', default = [13])
+    parser.add_argument('--stages', type = int, nargs = '+', help = 'Set numbers of stages N', default = [6])
+    parser.add_argument('-s', '--samples', type = int, nargs = '+', help = 'Set numbers of samples (0 means full enumeration)', default = [0])
+    parser.add_argument('--seeds', type = int, nargs = '+', help = 'Set seeds of the generated instances (and of their sampled scenarios)', default = [0])
+    parser.add_argument('-d', '--decay', type = float, help = 'Set rationality decay parameter (1 means fully rational)', default = 2)
+    parser.add_argument('--solvers', type = str, nargs = '+', choices = ['backward', 'parametric'], help = 'Set solvers to benchmark (the backward solver always runs as the reference)', default = ['backward', 'parametric'])
+    parser.add_argument('--no-memory', action = 'store_true', help = 'Skip the second pass that measures peak memory', default = False)
+    parser.add_argument('--folder', type = str, help = 'Path to the folder where instances are generated', default = 'benchmarks')
+    parser.add_argument('--output', type = str, help = 'Path to the results file', default = 'benchmarks/results.csv')
+    parser.add_argument('--baseline', type = str, help = 'Path to a previous results file to compare with', default = None)
+    parser.add_argument('--tolerance', type = float, help = 'Set relative slowdown over the baseline reported as a regression', default = .25)
+    arguments = parser.parse_args()
+
+    # The parametric solver writes its training points in this folder
+    if 'parametric' in arguments.solvers and not os.path.isdir('training'):
+        os.makedirs('training')
+
+    rows = []
+
+    for locations in arguments.locations:
+        for customers in arguments.customers:
+            for stages in arguments.stages:
+                for samples in arguments.samples:
+                    for seed in arguments.seeds:
+                        print('\n>>> Benchmarking |L| = {}, |C| = {}, N = {}, s = {}, seed = {}\n'.format(locations, customers, stages, samples, seed))
+                        rows.extend(benchmark(arguments.folder, locations, customers, stages, samples, seed, arguments.decay, arguments.solvers, not arguments.no_memory))
+
+    if os.path.dirname(arguments.output) and not os.path.isdir(os.path.dirname(arguments.output)):
+        os.makedirs(os.path.dirname(arguments.output))
+
+    with open(arguments.output, 'w', newline = '') as output:
+        writer = csv.writer(output)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+    print('\nWriting {} rows to {}'.format(len(rows), arguments.output))
+
+    if arguments.baseline is not None and compare(rows, arguments.baseline, arguments.tolerance) > 0:
+        sys.exit(1)
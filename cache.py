@@ -0,0 +1,116 @@
+import store as st
+import numpy as np
+import hashlib
+import os
+
+class Cache:
+
+    def __init__(self, folder = 'cache', capacity = 256):
+        """
+            Create solution cache within some folder, holding at most capacity megabytes
+        """
+
+        # Store folder with solution files and its size bound in bytes
+        self.folder = folder
+        self.capacity = capacity * 2**20
+        # Reuse the policy store encoding for solution files
+        self.store = st.Store(folder)
+
+    def key(self, solver, instance):
+        """
+            Hash the contents of the instance files along with the parameters that determine the solution
+        """
+
+        digest = hashlib.sha256()
+
+        for path in instance.paths:
+            with open(path, 'rb') as content:
+                digest.update(content.read())
+
+        # Streamed expectations use a coarser pruning cutoff than in-memory ones when epsilon is positive
+        # (the chunk size itself does not change the solution, only whether the solver streams expectations,
+        # which the vectorized solver never does)
+        streamed = instance.chunk > 0 and solver != 'vectorized'
+
+        # Full enumeration does not depend on the seed nor on the sampling strategy
+        sampled = (instance.seed, instance.strategy) if instance.s > 0 else (None, 'uniform')
+
+        parameters = [solver, instance.s, float(instance.d), *sampled, instance.threshold, instance.epsilon, streamed]
+        digest.update(repr(parameters).encode())
+
+        return digest.hexdigest()
+
+    def cacheable(self, instance):
+        """
+            Check if the solution for some instance is reproducible (sampled scenarios require a seed)
+        """
+
+        return instance.s == 0 or instance.seed is not None
+
+    def load(self, solver, instance):
+        """
+            Load stored_u and stored_J of some solver for some instance if cached (None otherwise)
+        """
+
+        if not self.cacheable(instance):
+            return None
+
+        path = os.path.join(self.folder, self.key(solver, instance) + '.npz')
+
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as content:
+            loaded = self.store.decode(content)
+
+        # Mark the file as recently used
+        os.utime(path)
+
+        return loaded['u'], loaded['J']
+
+    def save(self, solver, instance, stored_u, stored_J):
+        """
+            Save stored_u and stored_J of some solver for some instance, then evict old files beyond capacity
+        """
+
+        if not self.cacheable(instance):
+            return
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+        path = os.path.join(self.folder, self.key(solver, instance) + '.npz')
+        np.savez_compressed(path, **self.store.encode(instance, stored_u, stored_J))
+
+        self.evict()
+
+    def evict(self):
+        """
+            Remove least recently used files until the cache fits within capacity
+        """
+
+        paths = [os.path.join(self.folder, file) for file in os.listdir(self.folder) if file.endswith('.npz')]
+        paths.sort(key = os.path.getmtime)
+
+        size = sum(os.path.getsize(path) for path in paths)
+
+        # Always keep the most recent file, even if it exceeds capacity on its own
+        while size > self.capacity and len(paths) > 1:
+            path = paths.pop(0)
+            size -= os.path.getsize(path)
+            os.remove(path)
+
+    def solve(self, name, solver, *arguments):
+        """
+            Load the solution of some solver from the cache, or run the solver and cache its solution
+        """
+
+        loaded = self.load(name, solver.I)
+
+        if loaded is not None:
+            print('Loading {} solution from cache'.format(name))
+            solver.stored_u, solver.stored_J = loaded
+            return
+
+        solver.run_solver(*arguments)
+        self.save(name, solver.I, solver.stored_u, solver.stored_J)
@@ -1,17 +1,20 @@
 import matplotlib.pyplot as plt
 import argparse as ag
 import instance as it
-import backward as bd
+import vectorized as vz
+import cache as ch
 
 # Parse arguments using argparse
 parser = ag.ArgumentParser(description = 'Draw graph with varying values of the rationality decay parameter for some instance')
 parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
 parser.add_argument('max_decay', type = int, help = 'Maximum value for the rationality decay parameter')
 parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples (0 means full enumeration)', default = 0)
+parser.add_argument('--seed', type = int, help = 'Set seed of the random generator used for sampling (default is unseeded)', default = None)
+parser.add_argument('--cache', action = 'store_true', help = 'Load the reference solution from the solution cache (or save it there)', default = False)
 arguments = parser.parse_args()
 
 # Create problem object with d = 1
-problem = it.Instance(arguments.folder, arguments.samples, 1)
+problem = it.Instance(arguments.folder, arguments.samples, 1, arguments.seed)
 
 # Create list of values of parameter d
 ds = [1, 1.2, 1.4, 1.6, 1.8] + list(range(2, arguments.max_decay + 1))
@@ -22,19 +25,31 @@ bJs = {}
 for x in problem.X:
     bJs[x] = []
 
-# Loop over values of parameter d
-for d in ds:
+# Load cached solutions for values of parameter d (if any)
+cache = ch.Cache()
+solved = {}
+if arguments.cache:
+    for d in ds:
+        problem.d = d
+        loaded = cache.load('vectorized', problem)
+        if loaded is not None:
+            solved[d] = loaded[1]
 
-    # Set parameter d in the instance
-    problem.d = d
-    # Run the backward solver
-    solver = bd.Backward(problem)
-    solver.run_solver()
+# Run the backward solver for all remaining values of parameter d at once
+remaining = [d for d in ds if d not in solved]
+if len(remaining) > 0:
+    decayed_J, decayed_u = vz.Vectorized(problem).run_decays(remaining)
+    for d in remaining:
+        solved[d] = decayed_J[d]
+        if arguments.cache:
+            problem.d = d
+            cache.save('vectorized', problem, decayed_u[d], decayed_J[d])
 
-    # Store the J_0(x) values
-    k = 0
+# Store the J_0(x) values
+k = 0
+for d in ds:
     for x in problem.X:
-        bJs[x].append(solver.J(k, x))
+        bJs[x].append(solved[d][k][x])
 
 # Set colors for up to 11 states
 color = {
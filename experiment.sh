@@ -14,6 +14,9 @@ python main.py instances/small --parametric -d 1 --verbose
 python main.py instances/medium --backward --export -d 2
 # Compute (sampled) backward policy for instance large
 python main.py instances/large --backward --export -d 2 -s 512
+# Compare with the other sampling strategies for instance large
+# python main.py instances/large --backward --export -d 2 -s 512 --strategy stratified
+# python main.py instances/large --backward --export -d 2 -s 512 --strategy importance
 
 # Compute (full) parametric policy for instance large
 python main.py instances/medium --parametric --export -d 2
@@ -31,4 +34,9 @@ python decay_graph.py instances/large 50 -s 512
 # Compute graphs that varied the number of samples
 # These graphs did not make into the final project
 # python sample_graph.py instances/medium -d 2
-# python sample_graph.py instances/large -d 2 -s 512
\ No newline at end of file
+# python sample_graph.py instances/large -d 2 -s 512
+# Run a whole grid in a single process (or a pool with --workers), writing results.csv
+# python runner.py instances/medium instances/large -d 1 2 10 -s 0 128 512 --solvers backward parametric --repetitions 5 --seed 1 --workers 4
+
+# Compute the sample graphs in a single job with nested scenario sets (replications in parallel)
+# python sample_graph.py instances/large -d 2 -s 512 --seed 1 --nested 10 --workers 4
@@ -1,74 +1,100 @@
+import argparse as ag
 import random as rd
 import math
 import string
+import os
 
 def euclidean(point1, point2):
     # Compute Euclidean distance between two points
     return math.sqrt((point1[0]-point2[0])**2 + (point1[1]-point2[1])**2)
 
-# Set grid dimensions
-grid_x = 1000
-grid_y = 1000
-
-# Set instance characteristics
-number_stages = 6
-number_locations = 10
-number_customers = int(len(string.ascii_uppercase)/2)
-
-# Create useful strings
-str_locations = ', '.join([str(i) for i in range(1, number_locations + 1)])
-str_customers = ', '.join(string.ascii_uppercase[:int(len(string.ascii_uppercase)/2)])
-
-# Create random positions for locations
-map_locations = {}
-for location in range(0, number_locations):
-    x = rd.randint(0, grid_x)
-    y = rd.randint(0, grid_y)
-    map_locations[location] = (x, y)
-
-# Create random positions for customers
-map_customers = {}
-for customer in range(0, number_customers):
-    x = rd.randint(0, grid_x)
-    y = rd.randint(0, grid_y)
-    map_customers[customer] = (x, y)
-
-# Compute distances between customers and locations
-distances = {}
-for customer in range(0, number_customers):
-    distances[customer] = {}
+def label(index):
+    # Name customers A, B, ..., Z, then AA, AB, ... (as spreadsheet columns)
+    name = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, len(string.ascii_uppercase))
+        name = string.ascii_uppercase[remainder] + name
+    return name
+
+def generate(folder, number_locations = 10, number_customers = int(len(string.ascii_uppercase)/2), number_stages = 6, seed = None):
+    # Create random generator (seed None means fresh entropy)
+    generator = rd.Random(seed)
+
+    # Set grid dimensions
+    grid_x = 1000
+    grid_y = 1000
+
+    # Create useful strings
+    str_locations = ', '.join([str(i) for i in range(1, number_locations + 1)])
+    str_customers = ', '.join([label(customer) for customer in range(0, number_customers)])
+
+    # Create random positions for locations
+    map_locations = {}
     for location in range(0, number_locations):
-        distances[customer][location] = euclidean(map_customers[customer], map_locations[location])
-
-# Compute rankings over locations based on distance
-preferences = {}
-for customer in range(0, number_customers):
-    preferences[customer] = []
-    for location, _ in sorted(distances[customer].items(), key = lambda x: x[1]):
-        preferences[customer].append(str(location + 1))
-
-# Create metadata.txt
-with open('instances/random/metadata.txt', 'w') as output:
-    output.write('{}\n'.format(number_stages))
-    output.write('{}\n'.format(str_locations))
-    output.write('{}\n'.format(str_customers))
-
-# Create locations.csv
-with open('instances/random/locations.csv', 'w') as output:
-    output.write('id,m\n')
-    for location in range(1, number_locations + 1):
-        output.write('{},{}\n'.format(location, rd.randint(1,10)))
-
-# Create revenues.csv
-with open('instances/random/revenues.csv', 'w') as output:
-    output.write('id,{}\n'.format(str_locations.replace(' ', '')))
+        x = generator.randint(0, grid_x)
+        y = generator.randint(0, grid_y)
+        map_locations[location] = (x, y)
+
+    # Create random positions for customers
+    map_customers = {}
+    for customer in range(0, number_customers):
+        x = generator.randint(0, grid_x)
+        y = generator.randint(0, grid_y)
+        map_customers[customer] = (x, y)
+
+    # Compute distances between customers and locations
+    distances = {}
     for customer in range(0, number_customers):
-        output.write('{},{}\n'.format(string.ascii_uppercase[customer], ','.join([str(rd.randint(5,20)) for _ in range(0, number_locations)])))
+        distances[customer] = {}
+        for location in range(0, number_locations):
+            distances[customer][location] = euclidean(map_customers[customer], map_locations[location])
 
-# Create customers.csv
-with open('instances/random/customers.csv', 'w') as output:
-    output.write('id,{}\n'.format(str_locations.replace(' ', '')))
+    # Compute rankings over locations based on distance
+    preferences = {}
     for customer in range(0, number_customers):
-        output.write('{},{}\n'.format(string.ascii_uppercase[customer], ','.join(preferences[customer])))
+        preferences[customer] = []
+        for location, _ in sorted(distances[customer].items(), key = lambda x: x[1]):
+            preferences[customer].append(str(location + 1))
+
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    # Create metadata.txt
+    with open(os.path.join(folder, 'metadata.txt'), 'w') as output:
+        output.write('{}\n'.format(number_stages))
+        output.write('{}\n'.format(str_locations))
+        output.write('{}\n'.format(str_customers))
+
+    # Create locations.csv
+    with open(os.path.join(folder, 'locations.csv'), 'w') as output:
+        output.write('id,m\n')
+        for location in range(1, number_locations + 1):
+            output.write('{},{}\n'.format(location, generator.randint(1,10)))
+
+    # Create revenues.csv
+    with open(os.path.join(folder, 'revenues.csv'), 'w') as output:
+        output.write('id,{}\n'.format(str_locations.replace(' ', '')))
+        for customer in range(0, number_customers):
+            output.write('{},{}\n'.format(label(customer), ','.join([str(generator.randint(5,20)) for _ in range(0, number_locations)])))
+
+    # Create customers.csv
+    with open(os.path.join(folder, 'customers.csv'), 'w') as output:
+        output.write('id,{}\n'.format(str_locations.replace(' ', '')))
+        for customer in range(0, number_customers):
+            output.write('{},{}\n'.format(label(customer), ','.join(preferences[customer])))
+
+if __name__ == '__main__':
+
+    # Parse arguments using argparse
+    parser = ag.ArgumentParser(description = 'Generate a random instance')
+    parser.add_argument('--folder', type = str, help = 'Path to the folder where instance files are written', default = 'instances/random')
+    parser.add_argument('--locations', type = int, help = 'Set number of locations', default = 10)
+    parser.add_argument('--customers', type = int, help = 'Set number of customers', default = int(len(string.ascii_uppercase)/2))
+    parser.add_argument('--stages', type = int, help = 'Set number of stages', default = 6)
+    parser.add_argument('--seed', type = int, help = 'Set seed of the random generator (default is unseeded)', default = None)
+    arguments = parser.parse_args()
+
+    generate(arguments.folder, arguments.locations, arguments.customers, arguments.stages, arguments.seed)
 
-print('Random instance generated and exported to instances/random')
\ No newline at end of file
+    print('Random instance generated and exported to {}'.format(arguments.folder))
@@ -1,21 +1,218 @@
-import scipy.special as sp
-import itertools as tl
-import random as rd
-import pandas as pd
+import numpy as np
+import math
+import csv
 import os
 
 class Instance:
 
-    def __init__(self, folder, samples, decay):
+    def __init__(self, folder, samples, decay, seed = None, chunk = 0, strategy = 'uniform', threshold = 0.0001, epsilon = 0, binary = False):
         """
             Create instance object based on arguments
         """
 
-        # rd.seed(100)
+        # Create random generator for sampling (seed None means fresh entropy)
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
 
-        self.read_instance(folder, samples, decay)
+        # Set sampling strategy (uniform, stratified, or importance)
+        if strategy not in ['uniform', 'stratified', 'importance']:
+            raise Exception('Instance creation error: {} is not a valid sampling strategy'.format(strategy))
+        self.strategy = strategy
 
-    def read_instance(self, folder, samples, decay):
+        # Set number of scenarios per chunk when streaming expectations (0 means no streaming)
+        self.chunk = chunk
+
+        # Set pruning of scenarios in expectations: scenarios must have probability above threshold
+        # and, if epsilon is positive, be among the most likely ones covering 1 - epsilon of the mass
+        self.threshold = threshold
+        self.epsilon = epsilon
+
+        # Store distribution tables per stage k and state x
+        self.tables = {}
+        # Store expectation records per stage k, state x, and action u
+        self.records = {}
+        # Store feature matrices per stage k
+        self.batches = {}
+
+        self.read_instance(folder, samples, decay, binary)
+
+    @property
+    def d(self):
+        """
+            Retrieve rationality decay parameter
+        """
+
+        return self._d
+
+    @d.setter
+    def d(self, decay):
+        """
+            Update rationality decay parameter and discard outdated tables
+        """
+
+        self._d = decay
+        self.reset()
+
+    @property
+    def B(self):
+        """
+            Retrieve scenarios for competitor locations per stage, encoded as integer bitmasks
+            (either an array of bitmasks or a range of them, possibly shared among stages)
+        """
+
+        return self._B
+
+    @B.setter
+    def B(self, codes):
+        """
+            Update encoded scenarios for competitor locations and discard outdated views and tables
+        """
+
+        self._B = codes
+        # Weight all scenarios equally unless importance weights are provided
+        self.G = { k : None for k in codes }
+        # Build decoded views of the scenarios only when needed
+        self._W = None
+        self._S = None
+        # Index scenarios to retrieve their position within each stage
+        self.positions = {}
+        self.reset()
+
+    @property
+    def W(self):
+        """
+            Retrieve scenarios for competitor locations per stage as lists of locations
+        """
+
+        if self._W is None:
+            self._W = self.share(lambda codes: [self.decode(code) for code in codes])
+
+        return self._W
+
+    @W.setter
+    def W(self, scenarios):
+        """
+            Update scenarios for competitor locations and discard outdated tables
+        """
+
+        self.B = { k : np.array([self.bitmask(w) for w in scenarios[k]], dtype = np.int64) for k in scenarios }
+
+    @property
+    def S(self):
+        """
+            Retrieve scenarios for competitor locations per stage as boolean matrices of shape |W| x |L|
+        """
+
+        if self._S is None:
+            self._S = self.share(self.unpack)
+
+        return self._S
+
+    @property
+    def _m(self):
+        """
+            Retrieve maintenance costs per location as a dictionary
+        """
+
+        if '_m' not in self.views:
+            self.views['_m'] = { i : int(self.maintenance[position]) for position, i in enumerate(self.L) }
+
+        return self.views['_m']
+
+    @property
+    def rank(self):
+        """
+            Retrieve rankings of customers as lists of locations (most preferred first)
+        """
+
+        if 'rank' not in self.views:
+            self.views['rank'] = { j : [self.L[i] for i in self.ranks[position]] for position, j in enumerate(self.C) }
+
+        return self.views['rank']
+
+    @property
+    def _r(self):
+        """
+            Retrieve estimated revenues of customers per location as nested dictionaries
+        """
+
+        if '_r' not in self.views:
+            self.views['_r'] = { j : { i : float(self.gains[position][index]) for index, i in enumerate(self.L) } for position, j in enumerate(self.C) }
+
+        return self.views['_r']
+
+    def share(self, view):
+        """
+            Compute some view of the encoded scenarios per stage, only once for stages with the same scenarios
+        """
+
+        views = {}
+        computed = {}
+
+        for k, codes in self.B.items():
+            if id(codes) not in computed:
+                computed[id(codes)] = view(codes)
+            views[k] = computed[id(codes)]
+
+        return views
+
+    def unpack(self, codes):
+        """
+            Decode integer bitmasks (array or range) into a boolean matrix of shape |codes| x |L|
+        """
+
+        if isinstance(codes, range):
+            codes = np.arange(codes.start, codes.stop, codes.step, dtype = np.int64)
+
+        return ((codes[:, None] >> np.arange(len(self.L), dtype = np.int64)) & 1).astype(bool)
+
+    def chunks(self, k):
+        """
+            Iterate over the scenarios of stage k as boolean matrices with (at most) chunk rows each
+            (along with the logarithm of their weights)
+        """
+
+        codes = self.B[k]
+
+        for start in range(0, len(codes), self.chunk):
+            ids = np.arange(start, min(start + self.chunk, len(codes)))
+            yield self.unpack(codes[start:start + self.chunk]), self.weights(k, ids)
+
+    def weights(self, k, ids):
+        """
+            Retrieve the logarithm of the weights of scenarios ids at stage k
+            (weights correct the softmax for scenarios that were not sampled uniformly)
+        """
+
+        if self.G[k] is None:
+            return np.zeros(len(ids))
+
+        return self.G[k][ids]
+
+    def position(self, k, code):
+        """
+            Retrieve the position of the encoded scenario code within stage k
+        """
+
+        codes = self.B[k]
+
+        if isinstance(codes, range):
+            return codes.index(code)
+
+        if k not in self.positions:
+            self.positions[k] = { int(c) : index for index, c in enumerate(codes) }
+
+        return self.positions[k][code]
+
+    def reset(self):
+        """
+            Discard distribution tables and expectation records computed with outdated parameters
+        """
+
+        self.tables = {}
+        self.records = {}
+
+    def read_instance(self, folder, samples, decay, binary = False):
         """
             Read instance information from file
         """
@@ -44,6 +241,59 @@ class Instance:
         if not os.path.exists(revenues_path):
             raise Exception('Instance reading error: {} does not exist'.format(revenues_path))
 
+        # Store paths of instance information files (their contents identify the instance)
+        self.paths = [metadata_path, locations_path, customers_path, revenues_path]
+
+        # Read instance information from its binary form when it is up to date, otherwise parse the files
+        binary_path = os.path.join(folder, 'instance.npz')
+        if binary and os.path.exists(binary_path) and os.path.getmtime(binary_path) >= max(os.path.getmtime(path) for path in self.paths):
+            self.load_instance(binary_path)
+        else:
+            self.parse_instance(metadata_path, locations_path, customers_path, revenues_path)
+            if binary:
+                self.dump_instance(binary_path)
+
+        # Create set of time periods K
+        self.K = list(range(0, self.N + 1))
+
+        # Store maintenance costs as floats for array operations
+        self.costs = self.maintenance.astype(float)
+
+        # Build dictionary views of maintenance costs, rankings, and revenues only when needed
+        self.views = {}
+
+        # Set name of empty state (i.e., 0)
+        self.empty = '0'
+
+        # Set rationality decay parameter
+        self.d = decay
+
+        # Sample scenarios per time period according to parameter s
+        self.sample(samples)
+
+        # Create set of feasible states
+        self.X = [self.empty] + self.L
+
+        # Index feasible states to locate them in arrays over X
+        self.states = { x : position for position, x in enumerate(self.X) }
+
+        # Mark feasible actions u for every state x, shape |X| x |L|
+        self.feasible = np.array([[u != x for u in self.L] for x in self.X])
+
+        # Store position of every location in the ranking of every customer, shape |C| x |L|
+        self.orders = np.argsort(self.ranks, axis = 1)
+
+        # Store revenues of every single location competing against every single location, shape |L| x |L|
+        singletons = np.eye(len(self.L), dtype = bool)
+        self.duels = self.revenues(singletons[:, None, :], singletons[None, :, :])
+
+        # print(self)
+
+    def parse_instance(self, metadata_path, locations_path, customers_path, revenues_path):
+        """
+            Parse instance information files into arrays over location and customer positions
+        """
+
         # Read sets of locations and customers from metadata
         # Read number of time periods from metadata too
         with open(metadata_path) as content:
@@ -54,103 +304,231 @@ class Instance:
         # Format sets of locations and customers
         self.L = [i.strip() for i in self.L]
         self.C = [j.strip() for j in self.C]
-        # Create set of time periods K
-        self.K = list(range(0, self.N + 1))
+
+        # Index locations to encode sets of locations compactly
+        self.index = { i : position for position, i in enumerate(self.L) }
+        customers = { j : position for position, j in enumerate(self.C) }
 
         # Read maintenance costs for locations
-        locations_data = pd.read_csv(locations_path)
-        if len(locations_data) != len(self.L):
+        header, rows = self.read_table(locations_path)
+        if len(rows) != len(self.L):
             raise Exception('Instance reading error: {} is missing entries'.format(locations_path))
-        self._m = {}
-        for _, row in locations_data.iterrows():
-            self._m[str(row['id'])] = int(row['m'])
-
-        # Read rankings of customers
-        customers_data = pd.read_csv(customers_path)
-        if len(customers_data) != len(self.C):
+        if 'id' not in header or 'm' not in header:
+            raise Exception('Instance reading error: {} is missing columns'.format(locations_path))
+        self.maintenance = np.zeros(len(self.L), dtype = int)
+        self.maintenance[self.locate(rows[:, header.index('id')], self.index, locations_path)] = rows[:, header.index('m')].astype(float).astype(int)
+
+        # Read rankings of customers, where column n holds the location ranked n-th
+        header, rows = self.read_table(customers_path)
+        if len(rows) != len(self.C):
             raise Exception('Instance reading error: {} is missing entries'.format(customers_path))
-        if len(customers_data.columns) - 1!= len(self.L):
+        if len(header) - 1 != len(self.L) or 'id' not in header:
             raise Exception('Instance reading error: {} is missing columns'.format(customers_path))
-        self.rank = {}
-        for _, row in customers_data.iterrows():
-            self.rank[str(row['id'])] = []
-            for index, _ in enumerate(self.L):
-                self.rank[str(row['id'])].append(str(row[str(index + 1)]))
+        columns = [header.index(str(index + 1)) if str(index + 1) in header else -1 for index, _ in enumerate(self.L)]
+        if -1 in columns:
+            raise Exception('Instance reading error: {} is missing columns'.format(customers_path))
+        self.ranks = np.zeros((len(self.C), len(self.L)), dtype = int)
+        self.ranks[self.locate(rows[:, header.index('id')], customers, customers_path)] = self.locate(rows[:, columns], self.index, customers_path)
 
-        # Read estimated revenues of customers per location
-        revenues_data = pd.read_csv(revenues_path)
-        if len(revenues_data) != len(self.C):
+        # Read estimated revenues of customers per location, where column i holds location i
+        header, rows = self.read_table(revenues_path)
+        if len(rows) != len(self.C):
             raise Exception('Instance reading error: {} is missing entries'.format(revenues_path))
-        if len(revenues_data.columns) - 1!= len(self.L):
+        if len(header) - 1 != len(self.L) or 'id' not in header:
             raise Exception('Instance reading error: {} is missing columns'.format(revenues_path))
-        self._r = {}
-        for _, row in revenues_data.iterrows():
-            self._r[str(row['id'])] = {}
-            for index, _ in enumerate(self.L):
-                self._r[str(row['id'])][str(index + 1)] = float(row[str(index + 1)])
+        columns = [index for index, name in enumerate(header) if name != 'id']
+        self.gains = np.zeros((len(self.C), len(self.L)), dtype = float)
+        self.gains[np.ix_(self.locate(rows[:, header.index('id')], customers, revenues_path), self.locate(np.array(header)[columns], self.index, revenues_path))] = rows[:, columns].astype(float)
+
+    def read_table(self, path):
+        """
+            Read some CSV file into its header and a matrix of (stripped) strings
+        """
+
+        with open(path, newline = '') as content:
+            lines = [[cell.strip() for cell in line] for line in csv.reader(content) if line]
+
+        if len(lines) == 0 or any(len(line) != len(lines[0]) for line in lines):
+            raise Exception('Instance reading error: {} is malformed'.format(path))
+
+        return lines[0], np.array(lines[1:], dtype = str).reshape(len(lines) - 1, len(lines[0]))
+
+    def locate(self, names, index, path):
+        """
+            Translate an array of names into their positions according to some index
+        """
+
+        keys = np.array(list(index), dtype = str)
+        order = np.argsort(keys)
+        found = order[np.minimum(np.searchsorted(keys, names, sorter = order), len(keys) - 1)]
+
+        if np.any(keys[found] != names):
+            raise Exception('Instance reading error: {} has unknown entries'.format(path))
+
+        return found
+
+    def load_instance(self, binary_path):
+        """
+            Load instance information from its binary form
+        """
+
+        with np.load(binary_path) as content:
+            self.N = int(content['N'])
+            self.L = [str(i) for i in content['L']]
+            self.C = [str(j) for j in content['C']]
+            self.maintenance = content['maintenance']
+            self.ranks = content['ranks']
+            self.gains = content['gains']
+
+        self.index = { i : position for position, i in enumerate(self.L) }
+
+    def dump_instance(self, binary_path):
+        """
+            Save instance information in binary form to skip parsing in later runs
+        """
+
+        np.savez(binary_path, N = self.N, L = np.array(self.L), C = np.array(self.C), maintenance = self.maintenance, ranks = self.ranks, gains = self.gains)
+
+    def sample(self, samples):
+        """
+            Sample scenarios per time period according to parameter s (0 means full enumeration)
+            with the current sampling strategy and random generator, discarding outdated tables
+        """
 
-        # Sample scenarios per time period according to parameter s
         self.s = samples
         if self.s > 0:
             if self.s >= 2**len(self.L):
                 valid = int(round(0.9 * 2**len(self.L)))
                 print('Adjusting number of samples from {} to {}'.format(self.s, valid))
                 self.s = valid
-            self.W = { k : self.sample_scenarios() for k in self.K if k != self.N }
+            samples = { k : self.sample_scenarios(self.generator, k) for k in self.K if k != self.N }
+            self.B = { k : samples[k][0] for k in samples }
+            self.G = { k : samples[k][1] for k in samples }
         else:
-            self.W = { k : self.list_scenarios() for k in self.K if k != self.N }
+            # Enumerate scenarios only once since they are the same for every stage
+            everything = self.list_scenarios()
+            self.B = { k : everything for k in self.K if k != self.N }
 
-        # Set name of empty state (i.e., 0)
-        self.empty = '0'
+    def list_scenarios(self):
+        """
+            List all scenarios for competitor locations, encoded as a range of integer bitmasks
+        """
 
-        # Set rationality decay parameter
-        self.d = decay
+        return range(0, 2**len(self.L))
 
-        # Create set of feasible states
-        self.X = [self.empty] + self.L
+    def sample_scenarios(self, generator, k = 0):
+        """
+            Sample s scenarios for competitor locations at stage k according to the sampling strategy
+            (returns integer bitmasks and the logarithm of their weights, None meaning equal weights)
+        """
 
-        # print(self)
+        if self.strategy == 'stratified':
+            return self.stratify_scenarios(generator)
 
-    def list_scenarios(self):
+        if self.strategy == 'importance':
+            return self.propose_scenarios(generator, k)
+
+        # Draw distinct integers from [0, 2^|L|) in O(s), so every subset is equally likely
+        return generator.choice(2**len(self.L), size = self.s, replace = False).astype(np.int64), None
+
+    def stratify_scenarios(self, generator):
         """
-            List all scenarios for competitor locations
+            Sample s distinct scenarios for competitor locations, stratified by the number of locations
+            (strata get the same number of samples, weighted by the size of the stratum over that number)
         """
 
-        samples = []
+        sizes = np.arange(len(self.L) + 1)
+        strata = np.array([math.comb(len(self.L), size) for size in sizes], dtype = np.int64)
+
+        # Allocate samples equally among strata, moving the surplus of small strata to the others
+        allocation = np.zeros(len(sizes), dtype = np.int64)
+        remaining = self.s
+        while remaining > 0:
+            room = strata - allocation
+            open_strata = np.flatnonzero(room > 0)
+            share = np.minimum(room[open_strata], max(remaining // len(open_strata), 1))
+            share[np.cumsum(share) > remaining] = 0
+            allocation[open_strata] += share
+            remaining -= share.sum()
+
+        codes = []
+        weights = []
 
-        for size in range(0, len(self.L) + 1):
+        for size in sizes:
 
-            # List combinations of locations with a certain size
-            local = tl.combinations(self.L, size)
-            # Append this list of combinations to the samples
-            samples += [list(e) for e in local]
+            if allocation[size] == 0:
+                continue
 
-        return samples
+            sampled = np.zeros(0, dtype = np.int64)
 
-    def sample_scenarios(self):
+            # Draw random subsets with the stratum size until there are enough distinct ones
+            while len(sampled) < allocation[size]:
+                keys = generator.random((2 * (allocation[size] - len(sampled)), len(self.L)))
+                chosen = np.argsort(keys, axis = 1)[:, :size]
+                drawn = (np.int64(1) << chosen.astype(np.int64)).sum(axis = 1)
+                sampled = np.concatenate((sampled, drawn[~np.isin(drawn, sampled)]))
+                _, first = np.unique(sampled, return_index = True)
+                sampled = sampled[np.sort(first)]
+
+            codes.append(sampled[:allocation[size]])
+            weights.append(np.full(allocation[size], np.log(strata[size]) - np.log(allocation[size])))
+
+        return np.concatenate(codes), np.concatenate(weights)
+
+    def propose_scenarios(self, generator, k):
         """
-            Sample s scenarios for competitor locations
+            Sample s distinct scenarios for competitor locations at stage k proportionally to their softmax profitability weights
+            (scenarios with the s largest proposal log-probabilities perturbed by Gumbel noise are kept, i.e., Gumbel-top-k sampling
+            without replacement, weighted by the inverse of their probability of being kept given the next largest perturbed value)
         """
 
-        samples = []
+        everything = self.list_scenarios()
+        size = self.chunk if self.chunk > 0 else 2**16
+
+        # Compute beta based on rationality decay parameter
+        beta = 1 / self.d ** k
+
+        def profitable(codes):
+
+            omega = self.unpack(codes)
+
+            # Compute potential profits to pass to the softmax (without the company, i.e., at the empty state)
+            return beta * (self.revenues(omega, np.zeros(len(self.L), dtype = bool)) - self.maintenances(k, omega))
 
-        counter = 0
+        # First sweep: compute the logarithm of the normalization constant of the softmax
+        normalization = -np.inf
 
-        while counter <= self.s:
+        for start in range(0, len(everything), size):
+            normalization = np.logaddexp(normalization, np.logaddexp.reduce(profitable(everything[start:start + size])))
 
-            # Choose a random size for the combination
-            sizes = range(0, len(self.L) + 1)
-            size = rd.sample(sizes, 1)[0]
+        def proposal(codes):
 
-            # Sort elements to avoid repetition
-            sample = sorted(rd.sample(self.L, size))
+            # Mix the softmax with the uniform distribution to keep every scenario likely enough
+            # (i.e., every location x_k keeps scenarios without it even when profits are concentrated)
+            return np.logaddexp(profitable(codes) - normalization, -np.log(len(everything))) + np.log(.5)
 
-            # Check if sample has already been sampled
-            if sample not in samples:
-                samples.append(sample)
-                counter += 1
+        # Second sweep: perturb proposal log-probabilities with Gumbel noise, keeping the s + 1 largest ones
+        codes = np.zeros(0, dtype = np.int64)
+        keys = np.zeros(0)
 
-        return samples
+        for start in range(0, len(everything), size):
+
+            chunk = np.arange(start, min(start + size, len(everything)), dtype = np.int64)
+
+            codes = np.concatenate((codes, chunk))
+            keys = np.concatenate((keys, proposal(chunk) + generator.gumbel(size = len(chunk))))
+
+            if len(keys) > self.s + 1:
+                largest = np.argpartition(-keys, self.s)[:self.s + 1]
+                codes, keys = codes[largest], keys[largest]
+
+        # Keep the s largest perturbed values, the next one being the threshold they exceed
+        order = np.argsort(-keys)
+        threshold = keys[order[self.s]]
+        codes = np.sort(codes[order[:self.s]])
+
+        # Weight every scenario by the inverse of the probability that its perturbed value exceeds the threshold
+        return codes, -np.log(-np.expm1(-np.exp(proposal(codes) - threshold)))
 
     def __str__(self):
         """
@@ -171,11 +549,79 @@ class Instance:
                 payload += '{} ({}) {} '.format(self.rank[j][index], self._r[j][self.rank[j][index]], '>' if index != len(self.L) - 1 else '\n')
         payload += '\tNumber of periods: {}\n'.format(self.N)
         payload += '\tNumber of samples: {}\n'.format(self.s)
+        payload += '\tSampling strategy: {}\n'.format(self.strategy)
         payload += '\tRationality decay: {}\n'.format(self.d)
         payload += '\n*---------------------------------------------------*\n\n'
 
         return payload
 
+    def encode(self, y):
+        """
+            Encode set of locations y as a boolean vector over L (or list of sets of locations as a boolean matrix)
+        """
+
+        if len(y) > 0 and isinstance(y[0], list):
+            return np.array([self.encode(y_k) for y_k in y], dtype = bool)
+
+        encoded = np.zeros(len(self.L), dtype = bool)
+        encoded[[self.index[i] for i in y]] = True
+
+        return encoded
+
+    def bitmask(self, y_k):
+        """
+            Encode set of locations y_k as an integer bitmask over L
+        """
+
+        mask = 0
+
+        for i in y_k:
+            mask |= 1 << self.index[i]
+
+        return mask
+
+    def decode(self, mask):
+        """
+            Decode integer bitmask (or boolean vector) into a set of locations
+        """
+
+        if isinstance(mask, np.ndarray):
+            return [i for i in self.L if mask[self.index[i]]]
+
+        return [i for i in self.L if mask >> self.index[i] & 1]
+
+    def revenues(self, own, rival):
+        """
+            Compute the revenues of locations own competing against locations rival for all rows at once
+            (both arguments are boolean arrays whose last axis is L and that are broadcast against each other)
+        """
+
+        own, rival = np.broadcast_arrays(np.atleast_2d(own), np.atleast_2d(rival))
+
+        customers = np.arange(len(self.C))
+
+        # Order occupied locations according to the ranking of each customer
+        occupied = (own | rival)[..., self.ranks]
+
+        # Find the most preferred occupied location of each customer
+        first = occupied.argmax(axis = -1)
+        chosen = self.ranks[customers, first]
+
+        # Keep customers served by own locations (ties favor own locations)
+        served = occupied.any(axis = -1) & np.take_along_axis(own, chosen, axis = -1)
+
+        return np.where(served, self.gains[customers, chosen], .0).sum(axis = -1)
+
+    def maintenances(self, k, own):
+        """
+            Compute the maintenance costs of locations own at stage k for all rows at once
+        """
+
+        if k == 0:
+            return np.zeros(np.atleast_2d(own).shape[0])
+
+        return np.atleast_2d(own) @ self.costs
+
     def r(self, y_k, w_k):
         """
             Compute the revenue of the company with locations y_k competing against competitors with locations w_k
@@ -246,7 +692,7 @@ class Instance:
 
     def profitability(self, k, w_k, y_k):
         """
-            Compute pthe robability of having competitor locations w_k with location y_k based on profitability
+            Compute the probability of having competitor locations w_k with location y_k based on profitability
         """
 
         x_k = y_k[0] if len(y_k) == 1 else None
@@ -256,19 +702,237 @@ class Instance:
         if x_k in w_k:
             return .0
 
-        omega = [w for w in self.W[k] if x_k not in w]
+        table = self.table(k, x_k if x_k is not None else self.empty)
+
+        return table['distribution'][self.position(k, self.bitmask(w_k))]
+
+    def table(self, k, x_k):
+        """
+            Retrieve the distribution table of competitor locations at stage k with location x_k
+        """
+
+        if (k, x_k) not in self.tables:
+
+            ids, profits = self.candidates(k, x_k)
+
+            # Compute beta based on rationality decay parameter
+            beta = 1 / self.d ** k
+
+            # Scale potential profits to pass to the softmax (shifted by the weights of the scenarios)
+            profits = beta * profits + self.weights(k, ids)
 
-        index = omega.index(w_k)
+            probabilities = np.exp(profits - np.logaddexp.reduce(profits)) if len(profits) > 0 else profits
+
+            # Spread probabilities over all scenarios for direct lookups
+            distribution = np.zeros(len(self.B[k]))
+            distribution[ids] = probabilities
+
+            # Keep only the support of the distribution for expectations
+            support = self.prune(probabilities)
+
+            self.tables[k, x_k] = {
+                'ids': ids,
+                'probabilities': probabilities,
+                'distribution': distribution,
+                'support': ids[support],
+                'weights': probabilities[support],
+                'dropped': 1 - probabilities[support].sum()
+            }
+
+        return self.tables[k, x_k]
+
+    def candidates(self, k, x_k):
+        """
+            Retrieve the realizations w at stage k with location x_k along with their potential profits
+            for competitors (i.e., before scaling by beta, so they do not depend on the rationality decay)
+        """
+
+        y_k = [x_k] if x_k != self.empty else []
+
+        # Filter realizations w that have location x_k as an element
+        # (i.e., competitors do not perceive location x_k as avaialble)
+        if x_k != self.empty:
+            ids = np.flatnonzero(~self.S[k][:, self.index[x_k]])
+        else:
+            ids = np.arange(len(self.B[k]))
+
+        omega = self.S[k][ids]
+
+        return ids, self.revenues(omega, self.encode(y_k)) - self.maintenances(k, omega)
+
+    def prune(self, probabilities):
+        """
+            Select the support of some probability vector (i.e., entries kept when computing expectations)
+        """
+
+        support = probabilities > self.threshold
+
+        if self.epsilon > 0:
+
+            # Keep the most likely entries until they cover 1 - epsilon of the mass
+            order = np.argsort(-probabilities, kind = 'stable')
+            count = np.searchsorted(np.cumsum(probabilities[order]), 1 - self.epsilon) + 1
+
+            likely = np.zeros(len(probabilities), dtype = bool)
+            likely[order[:count]] = True
+
+            support &= likely
+
+        return support
+
+    def dropped(self, k, x_k):
+        """
+            Compute the probability mass dropped by pruning at stage k with location x_k
+        """
+
+        return 1 - sum(self.expectation(k, x_k, self.empty)['transition'].values())
+
+    def expectation(self, k, x_k, u_k):
+        """
+            Retrieve the expectation record at stage k with location x_k and action u_k
+            (i.e., the next-state distribution and the expected revenue over realizations w)
+        """
+
+        if (k, x_k, u_k) not in self.records and self.chunk > 0:
+
+            # Stream over scenarios to build the records of all actions u at once
+            self.stream(k, x_k)
+
+        if (k, x_k, u_k) not in self.records:
+
+            # Retrieve realizations w within the support of the distribution
+            table = self.table(k, x_k)
+            p = table['weights']
+            omega = self.S[k][table['support']]
+
+            # Build the records of all actions u at once, in a single pass over realizations w
+            self.summarize(k, x_k, p.sum(), p @ omega, self.histogram(p, self.leading(omega)))
+
+        return self.records[k, x_k, u_k]
+
+    def stream(self, k, x_k):
+        """
+            Compute the expectation records at stage k with location x_k for all actions u, sweeping scenarios by chunks
+            (memory is bounded by the chunk size, regardless of the number of scenarios)
+        """
+
+        y_k = [x_k] if x_k != self.empty else []
 
         # Compute beta based on rationality decay parameter
         beta = 1 / self.d ** k
 
-        # Compute potential profits to pass to the softmax
-        profits = [beta * (self.r(w, y_k) - self.m(k, w)) for w in omega]
+        def profitable(chunk):
+
+            omega, weights = chunk
+
+            # Filter realizations w that have location x_k as an element
+            # (i.e., competitors do not perceive location x_k as avaialble)
+            if x_k != self.empty:
+                available = ~omega[:, self.index[x_k]]
+                omega, weights = omega[available], weights[available]
+
+            # Compute potential profits to pass to the softmax (shifted by the weights of the scenarios)
+            profits = beta * (self.revenues(omega, self.encode(y_k)) - self.maintenances(k, omega)) + weights
+
+            return omega, profits
+
+        # First sweep: compute the logarithm of the normalization constant of the softmax
+        # (i.e., a running log-sum-exp over chunks, which stays stable for any value of beta)
+        normalization = -np.inf
 
-        exp = sp.softmax(profits)
+        for _, profits in map(profitable, self.chunks(k)):
+            normalization = np.logaddexp(normalization, np.logaddexp.reduce(profits) if len(profits) > 0 else -np.inf)
 
-        return exp[index]
+        cutoff = self.threshold
+
+        if self.epsilon > 0:
+
+            # Additional sweep: accumulate the mass of scenarios per bin of log-probabilities (of width 0.01)
+            # to find the probability above which the most likely scenarios cover 1 - epsilon of the mass
+            width = .01
+            mass = np.zeros(10000)
+
+            for _, profits in map(profitable, self.chunks(k)):
+                bins = np.minimum(((normalization - profits) / width).astype(int), len(mass) - 1)
+                mass += np.bincount(bins, weights = np.exp(profits - normalization), minlength = len(mass))
+
+            covering = min(np.searchsorted(np.cumsum(mass), 1 - self.epsilon), len(mass) - 1)
+            cutoff = max(cutoff, np.exp(-(covering + 1) * width))
+
+        kept = .0
+        included = np.zeros(len(self.L))
+        ranked = np.zeros((len(self.C), len(self.L) + 1))
+
+        # Second sweep: accumulate next-state probabilities and revenues of all actions u in the same pass
+        for omega, profits in map(profitable, self.chunks(k)):
+
+            # Retrieve realizations w within the support of the distribution
+            p = np.exp(profits - normalization)
+            relevant = p > cutoff
+            p = p[relevant]
+            omega = omega[relevant]
+
+            kept += p.sum()
+            included += p @ omega
+            ranked += self.histogram(p, self.leading(omega))
+
+        self.summarize(k, x_k, kept, included, ranked)
+
+    def leading(self, omega):
+        """
+            Find the best rank among competitor locations of every realization for every customer, shape |W| x |C|
+            (rank |L| means no competitor location at all)
+        """
+
+        return np.where(omega[:, None, :], self.orders[None, :, :], len(self.L)).min(axis = 2)
+
+    def histogram(self, p, best):
+        """
+            Compute, for every customer, the probability that the best ranked competitor location has rank r
+            given the best ranks of realizations with probabilities p, shape |C| x (|L| + 1)
+        """
+
+        # Accumulate probabilities per customer and rank
+        cells = best + (len(self.L) + 1) * np.arange(len(self.C))
+        weights = np.broadcast_to(p[:, None], best.shape)
+
+        return np.bincount(cells.ravel(), weights = weights.ravel(), minlength = len(self.C) * (len(self.L) + 1)).reshape(len(self.C), len(self.L) + 1)
+
+    def expected_revenues(self, ranked):
+        """
+            Compute the expected revenue of every action u from histograms of best competitor ranks
+            (leading axes of the histograms are kept, shape ... x |L|)
+        """
+
+        # Compute the probability that competitors rank strictly after every rank r for every customer
+        after = np.cumsum(ranked[..., ::-1], axis = -1)[..., ::-1]
+        after = np.concatenate((after[..., 1:], np.zeros(ranked.shape[:-1] + (1,))), axis = -1)
+
+        # Customers go to location u when competitors rank after it (location u is then free)
+        customers = np.arange(len(self.C))[:, None]
+
+        return (self.gains * after[..., customers, self.orders]).sum(axis = -2)
+
+    def summarize(self, k, x_k, kept, included, ranked):
+        """
+            Build the expectation records at stage k with location x_k for all actions u in closed form
+            (the company goes to location u unless competitors take it, so only the mass kept, the probability
+            that every location is included in w, and the histogram of best competitor ranks are needed)
+        """
+
+        revenue = self.expected_revenues(ranked)
+
+        for u_k in self.L:
+
+            self.records[k, x_k, u_k] = {
+                'transition': { self.empty : included[self.index[u_k]], u_k : kept - included[self.index[u_k]] },
+                'revenue': revenue[self.index[u_k]]
+            }
+
+        self.records[k, x_k, self.empty] = {
+            'transition': { self.empty : kept },
+            'revenue': .0
+        }
 
     def U(self, x_k):
         """
@@ -280,28 +944,45 @@ class Instance:
     def phi(self, k, x_k, u_k):
         """
             Compute the feature vector based on location x_k and location u_k
+            (i.e., retrieve the corresponding row of the feature matrix of stage k)
         """
 
-        features = []
+        return list(self.phi_batch(k)[self.states[x_k] * len(self.L) + self.index[u_k]])
 
-        # Create first set of features: distance between locations x_k and u_k for customer profile j
-        features += [self.rank[j].index(x_k) - self.rank[j].index(u_k) if x_k != self.empty else len(self.L) + 1 for j in self.C]
+    def phi_batch(self, k):
+        """
+            Compute the feature matrix for all states x and actions u at stage k, shape (|X| * |L|) x features
+            (row x * |L| + u holds the features of state x and action u, see the feasible mask for the rows to keep)
+        """
 
-        y_k = [x_k] if x_k != self.empty else []
-        z_k = [u_k]
+        if k not in self.batches:
+
+            # Retrieve positions of locations over X, the empty state being encoded as -1
+            states = np.array([self.index[x] if x != self.empty else -1 for x in self.X])
+            actions = np.arange(len(self.L))
+
+            # Broadcast states and actions over the grid |X| x |L|
+            x_k = np.repeat(states, len(self.L))
+            u_k = np.tile(actions, len(self.X))
+            located = x_k >= 0
 
-        # Create second set of features: revenues for locations x_k and u_k competing one competitor location w
-        for w in self.L:
+            # Create first set of features: distance between locations x_k and u_k for customer profile j
+            distances = np.where(located[:, None], self.orders[:, x_k].T - self.orders[:, u_k].T, len(self.L) + 1)
 
-            features += [self.r(y_k, [w])]
+            # Create second set of features: revenues for locations x_k and u_k competing one competitor location w
+            revenues_y = np.where(located[:, None], self.duels[x_k], .0)
+            revenues_z = self.duels[u_k]
+            revenues = np.stack((revenues_y, revenues_z), axis = 2).reshape(len(x_k), 2 * len(self.L))
 
-            features += [self.r(z_k, [w])]
+            # Create third set of features: maintenance for locations x_k and u_k
+            maintenances = np.zeros((len(x_k), 2))
+            if k != 0:
+                maintenances[:, 0] = np.where(located, self.costs[x_k], .0)
+                maintenances[:, 1] = self.costs[u_k]
 
-        # Create third set of features: maintenance for locations x_k and u_k
-        features += [self.m(k, y_k)]
-        features += [self.m(k, z_k)]
+            self.batches[k] = np.ascontiguousarray(np.hstack((distances, revenues, maintenances)), dtype = float)
 
-        return features
+        return self.batches[k]
 
     def dummy(self):
         """
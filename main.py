@@ -1,64 +1,129 @@
+import importlib as il
 import argparse as ag
-import instance as it
-import backward as bd
-import parametric as pd
 import time as tm
 import datetime as dt
 
-parser = ag.ArgumentParser(description = 'Compute backward and parametric policies for some instance')
-parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
-parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples (0 means full enumeration)', default = 0)
-parser.add_argument('-d', '--decay', type = int, help = 'Set rationality decay parameter (1 means fully rational)', default = 1)
-parser.add_argument('--backward', action = 'store_true', help = 'Run the backward solver for the selected instance', default = False)
-parser.add_argument('--parametric', action = 'store_true', help = 'Run the parametric solver for the selected instance', default = False)
-parser.add_argument('--verbose', action = 'store_true', help = 'Print detailed computations when training and running the solvers', default = False)
-parser.add_argument('--policies', action = 'store_true', help = 'Print policies found by the solvers in textual format', default = False)
-parser.add_argument('--export', action = 'store_true', help = 'Export policies found by the solvers to a file', default = False)
-arguments = parser.parse_args()
-
-start_time = tm.time()
-print('>>> Starting script at time {}'.format(dt.datetime.now()))
-
-print('\n--------------------- Instance -----------------------\n')
-
-# Create instance object
-problem = it.Instance(arguments.folder, arguments.samples, arguments.decay)
-
-if arguments.backward:
-
-    print('\n--------------------- Backward -----------------------\n')
-
-    # Run backward solver for the instance
-    backward_solver = bd.Backward(problem)
-    backward_solver.run_solver(arguments.verbose)
-    if arguments.policies:
-        backward_solver.print_policy()
-    if arguments.export:
-        backward_solver.export_policy()
-    backward_solver.print_summary()
-
-if arguments.parametric:
-
-    print('\n-------------------- Parametric ----------------------\n')
-
-    # Run parametric solver for the instance
-    parametric_solver = pd.Parametric(problem)
-    training_start = tm.time()
-    parametric_solver.train_solver(arguments.verbose)
-    training_end = tm.time()
-    print('# Elapsed time with training: {} seconds'.format(round(training_end - training_start, 4)))
-    parametric_solver.run_solver(arguments.verbose)
-    print('# Elapsed time with solving: {} seconds'.format(round(tm.time() - training_end, 4)))
-    if arguments.policies:
-        parametric_solver.print_policy()
-    if arguments.export:
-        parametric_solver.export_policy()
-    parametric_solver.print_summary()
-
-print('\n------------------- Information ----------------------\n')
-
-print('If nothing has been done, type python main.py --help for help\n')
-
-end_time = tm.time()
-print('>>> Ending script at time {}'.format(dt.datetime.now()))
-print('>>> Elapsed time within the script: {} seconds'.format(round(end_time - start_time, 4)))
\ No newline at end of file
+# Record time of the first statement to break down startup time
+script_time = tm.perf_counter()
+
+# Record time spent on each startup step (importing modules and loading the instance)
+startup = []
+
+def timed_import(name):
+    """
+        Import some module (only when needed) and record the time spent on it
+    """
+
+    start = tm.perf_counter()
+    module = il.import_module(name)
+    startup.append(('Importing {}'.format(name), tm.perf_counter() - start))
+
+    return module
+
+# Guard the script so that worker processes can import it safely
+if __name__ == '__main__':
+
+    parser = ag.ArgumentParser(description = 'Compute backward and parametric policies for some instance')
+    parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
+    parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples (0 means full enumeration)', default = 0)
+    parser.add_argument('--chunk', type = int, help = 'Set number of scenarios per chunk to stream expectations in bounded memory (0 means no streaming)', default = 0)
+    parser.add_argument('--strategy', type = str, choices = ['uniform', 'stratified', 'importance'], help = 'Set sampling strategy for the scenarios (requires -s, importance sweeps all 2^|L| scenarios per stage to build its proposal)', default = 'uniform')
+    parser.add_argument('--threshold', type = float, help = 'Set probability under which scenarios are dropped from expectations', default = 0.0001)
+    parser.add_argument('--epsilon', type = float, help = 'Set probability mass that the most likely scenarios may leave out of expectations (0 means no limit)', default = 0)
+    parser.add_argument('--seed', type = int, help = 'Set seed of the random generator used for sampling (default is unseeded)', default = None)
+    parser.add_argument('--binary', action = 'store_true', help = 'Load the instance from its binary form (created on the first run) instead of parsing its files', default = False)
+    parser.add_argument('-d', '--decay', type = int, help = 'Set rationality decay parameter (1 means fully rational)', default = 1)
+    parser.add_argument('--backward', action = 'store_true', help = 'Run the backward solver for the selected instance', default = False)
+    parser.add_argument('--vectorized', action = 'store_true', help = 'Use array operations within the backward solver and the parametric policy extraction', default = False)
+    parser.add_argument('--workers', type = int, help = 'Set number of worker processes for the backward solver', default = 1)
+    parser.add_argument('--parametric', action = 'store_true', help = 'Run the parametric solver for the selected instance', default = False)
+    parser.add_argument('--ridge', type = float, help = 'Set ridge regularization when training the parametric solver (0 means plain least squares)', default = 0)
+    parser.add_argument('--cache', action = 'store_true', help = 'Load the backward solution from the solution cache (or save it there)', default = False)
+    parser.add_argument('--profile-startup', action = 'store_true', help = 'Print time spent on imports and instance loading before running the solvers', default = False)
+    parser.add_argument('--simulate', type = int, help = 'Set number of trajectories to simulate the policies found by the solvers (0 means no simulation)', default = 0)
+    parser.add_argument('--verbose', action = 'store_true', help = 'Print detailed computations when training and running the solvers', default = False)
+    parser.add_argument('--policies', action = 'store_true', help = 'Print policies found by the solvers in textual format', default = False)
+    parser.add_argument('--export', action = 'store_true', help = 'Export policies found by the solvers to a file', default = False)
+    arguments = parser.parse_args()
+    # The vectorized solver runs within a single process
+    if arguments.backward and arguments.vectorized and arguments.workers > 1:
+        parser.error('--workers cannot be combined with --vectorized for the backward solver')
+    # The vectorized solver keeps all scenarios of a stage in memory, so it cannot stream expectations
+    if arguments.backward and arguments.vectorized and arguments.chunk > 0:
+        parser.error('--chunk cannot be combined with --vectorized for the backward solver')
+
+    startup.append(('Parsing arguments', tm.perf_counter() - script_time))
+
+    start_time = tm.time()
+    print('>>> Starting script at time {}'.format(dt.datetime.now()))
+
+    print('\n--------------------- Instance -----------------------\n')
+
+    # Create instance object (NumPy is imported first to report its time separately)
+    timed_import('numpy')
+    it = timed_import('instance')
+    loading_start = tm.perf_counter()
+    problem = it.Instance(arguments.folder, arguments.samples, arguments.decay, arguments.seed, arguments.chunk, arguments.strategy, arguments.threshold, arguments.epsilon, arguments.binary)
+    startup.append(('Loading instance', tm.perf_counter() - loading_start))
+
+    if arguments.backward:
+
+        print('\n--------------------- Backward -----------------------\n')
+
+        # Run backward solver for the instance
+        if arguments.vectorized:
+            backward_solver = timed_import('vectorized').Vectorized(problem)
+        else:
+            backward_solver = timed_import('backward').Backward(problem)
+        if arguments.vectorized:
+            solve_arguments = [arguments.verbose]
+        else:
+            solve_arguments = [arguments.verbose, arguments.workers]
+        if arguments.cache:
+            timed_import('cache').Cache().solve('vectorized' if arguments.vectorized else 'backward', backward_solver, *solve_arguments)
+        else:
+            backward_solver.run_solver(*solve_arguments)
+        if arguments.policies:
+            backward_solver.print_policy()
+        if arguments.export:
+            backward_solver.export_policy()
+        backward_solver.print_summary()
+        if arguments.simulate > 0:
+            timed_import('simulator').Simulator(problem, arguments.seed).print_summary(backward_solver.stored_u, arguments.simulate)
+
+    if arguments.parametric:
+
+        print('\n-------------------- Parametric ----------------------\n')
+
+        # Run parametric solver for the instance
+        parametric_solver = timed_import('parametric').Parametric(problem)
+        training_start = tm.time()
+        parametric_solver.train_solver(arguments.verbose, arguments.ridge)
+        training_end = tm.time()
+        print('# Elapsed time with training: {} seconds'.format(round(training_end - training_start, 4)))
+        parametric_solver.run_solver(arguments.verbose, arguments.vectorized)
+        print('# Elapsed time with solving: {} seconds'.format(round(tm.time() - training_end, 4)))
+        if arguments.policies:
+            parametric_solver.print_policy()
+        if arguments.export:
+            parametric_solver.export_policy()
+        parametric_solver.print_summary()
+        if arguments.simulate > 0:
+            timed_import('simulator').Simulator(problem, arguments.seed).print_summary(parametric_solver.stored_u, arguments.simulate)
+
+    if arguments.profile_startup:
+
+        print('\n---------------------- Startup -----------------------\n')
+
+        # Print time spent on every startup step
+        for step, elapsed in startup:
+            print('\t{}: {} seconds'.format(step, round(elapsed, 4)))
+        print('# Elapsed time with startup: {} seconds'.format(round(sum(elapsed for _, elapsed in startup), 4)))
+
+    print('\n------------------- Information ----------------------\n')
+
+    print('If nothing has been done, type python main.py --help for help\n')
+
+    end_time = tm.time()
+    print('>>> Ending script at time {}'.format(dt.datetime.now()))
+    print('>>> Elapsed time within the script: {} seconds'.format(round(end_time - start_time, 4)))
\ No newline at end of file
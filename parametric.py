@@ -1,6 +1,5 @@
 import numpy as np
-import scipy.optimize as sp
-import uuid
+import store as st
 
 class Parametric:
 
@@ -15,41 +14,40 @@ class Parametric:
         self.stored_r = {}
         # Store \mu_k(x) values
         self.stored_u = {}
+        # Store minimum \tilde{Q}_k(x,u) values over actions u
+        self.stored_Jtilde = {}
 
-    def train_solver(self, verbose = False):
+    def train_solver(self, verbose = False, ridge = 0):
         """
             Train a linear architecture for the Parametric solver
+            (returns fit diagnostics per stage; ridge > 0 regularizes the least squares problem)
         """
 
         print('Training parametric solver')
 
+        # Store fit diagnostics per stage
+        diagnostics = {}
+
+        # Discard minimum values computed with previous coefficients
+        self.stored_Jtilde = {}
+
         # Loop over planning stages
         for k in reversed(self.I.K):
 
             if k != self.I.N:
 
-                # Create function to be minimized using least squares
-                def to_minimize(r, points, labels):
-
-                    return [np.dot(r, point) - label for point, label in zip(points, labels)]
-
-                # Retrieve dummy coefficients r0 as starting point
-                r0 = self.I.dummy()
+                # Create matrix of points based on states x and feasible actions u
+                points = self.I.phi_batch(k)[self.I.feasible.ravel()]
 
-                # Create list of points based on states x and actions u
-                points = [self.I.phi(k, x, u) for x in self.I.X for u in self.I.U(x)]
+                # Create vector of labels based on the \hat{Q}_k(x,u) function
+                labels = np.array([self.Qhat(k, x, u) for x in self.I.X for u in self.I.U(x)], dtype = float)
 
-                # Double the list of points to make sure there is enough
-                points += points
-
-                # Create list of labels based on the \hat{Q}_k(x,u) function
-                labels = [self.Qhat(k, x, u) for x in self.I.X for u in self.I.U(x)]
-
-                # Double the list of labels to make sure there is enough
-                labels += labels
-
-                # Call the least squares minimizer
-                report = sp.leastsq(to_minimize, r0, (points, labels))
+                # Solve the linear least squares problem directly (the problem is linear in r_k)
+                if ridge > 0:
+                    coefficients = np.linalg.solve(points.T @ points + ridge * np.eye(points.shape[1]), points.T @ labels)
+                    rank = np.linalg.matrix_rank(points)
+                else:
+                    coefficients, _, rank, _ = np.linalg.lstsq(points, labels, rcond = None)
 
                 # Export the data used for the training
                 with open('training/{}_{}.csv'.format(self.I.name, k), 'w') as output:
@@ -58,22 +56,38 @@ class Parametric:
                         output.write('{},{}\n'.format(labels[i], ','.join([str(e) for e in points[i]])))
 
                 # Store the r_k coefficient trained in this stage
-                self.stored_r[k] = report[0]
+                self.stored_r[k] = coefficients
+
+                diagnostics[k] = {
+                    'residual': np.linalg.norm(points @ coefficients - labels),
+                    'rank': int(rank),
+                    'points': points.shape[0],
+                    'features': points.shape[1]
+                }
 
         if verbose:
             print('Parameters of linear architecture:')
             for k in self.I.K:
                 if k != self.I.N:
                     print('\tStage {}: {}'.format(k, self.stored_r[k]))
+            print('Diagnostics of linear architecture:')
+            for k in self.I.K:
+                if k != self.I.N:
+                    print('\tStage {}: residual norm {} with rank {} ({} points, {} features)'.format(k, round(diagnostics[k]['residual'], 4), diagnostics[k]['rank'], diagnostics[k]['points'], diagnostics[k]['features']))
 
+        return diagnostics
 
-    def run_solver(self, verbose = False):
+    def run_solver(self, verbose = False, vectorized = False):
         """
             Solve the problem instance with Parametric solver
+            (all actions of a stage are compared at once if vectorized is set)
         """
 
         print('Running parametric solver')
 
+        if vectorized:
+            return self.extract_policy(verbose)
+
         # Loop over planning stages
         for k in self.I.K:
 
@@ -116,6 +130,38 @@ class Parametric:
 
                     self.stored_u[k][x] = action
 
+    def extract_policy(self, verbose = False):
+        """
+            Extract the policy of the Parametric solver with one matrix-vector product per stage
+        """
+
+        # Loop over planning stages
+        for k in self.I.K:
+
+            if verbose:
+                print('\tStage {}'.format(k))
+
+            self.stored_u[k] = {}
+
+            if k == self.I.N:
+
+                # No action to take at stage k
+                for x in self.I.X:
+                    self.stored_u[k][x] = -1
+
+                continue
+
+            # Compute optimal \tilde{Q}_k(x,u) for all states x at once
+            Q = self.Qtilde_batch(k)
+            optimal = Q.argmin(axis = 1)
+
+            for index, x in enumerate(self.I.X):
+
+                if verbose:
+                    print('\t\tState {} -> action {} with Qtilde_{}({}, {}) = {}'.format(x, self.I.L[optimal[index]], k, x, self.I.L[optimal[index]], round(Q[index, optimal[index]], 2)))
+
+                self.stored_u[k][x] = self.I.L[optimal[index]]
+
     def Qhat(self, k, x, u):
         """
             Compute the \hat{Q}_k(x,u) value with the expectation term
@@ -130,50 +176,67 @@ class Parametric:
         # Compute the deterministic term
         cost = self.I.m(k, y)
 
+        # Retrieve the expectation record of state x and action u
+        record = self.I.expectation(k, x, u)
+
         # Compute the expectation term
-        for w in self.I.W[k]:
+        cost -= record['revenue'] # + self.I.t(x, x_next)
 
-            p = self.I.p(k, w, y)
+        # Retrieve J_{k+1}(x) through \tilde{Q}_{k+1}(x,u) minimized over actions u
+        minimum = self.minimum(k + 1)
 
-            if p > 0.0001:
+        for x_next, p in record['transition'].items():
 
-                y_next = self.I.f(y, u, w)
+            cost += p * minimum[x_next]
 
-                x_next = self.I.empty if len(y_next) == 0 else y_next[0]
+        return cost
 
-                cost -= p * self.I.r(y_next, w) # + self.I.t(x, x_next)
+    def Qtilde(self, k, x, u):
+        """
+            Compute the \tilde{Q}_k(x,u) value with the linear approximation
+        """
 
-                # Retrieve J_{k+1}(x) through \tilde{Q}_{k+1}(x,u)
+        y = [x] if x != self.I.empty else []
 
-                U  = self.I.U(x_next)
+        if k == self.I.N:
+            return self.I.m(k, y)
 
-                minimum = self.Qtilde(k + 1, x_next, U[0])
+        phi = self.features(k, x, u)
 
-                for u_next in self.I.U(x_next):
+        return np.dot(self.stored_r[k], phi)
 
-                    local = self.Qtilde(k + 1, x_next, u_next)
+    def features(self, k, x, u):
+        """
+            Retrieve the \phi_k(x,u) feature vector from the feature matrix of stage k
+        """
 
-                    if local < minimum:
+        return self.I.phi_batch(k)[self.I.states[x] * len(self.I.L) + self.I.index[u]]
 
-                        minimum = local
+    def Qtilde_batch(self, k):
+        """
+            Compute the \tilde{Q}_k(x,u) values for all states x and actions u, shape |X| x |L|
+            (infeasible actions, i.e., action u is the same as state x, are masked with infinity)
+        """
 
-                cost += p * minimum
+        if k == self.I.N:
+            Q = np.repeat(self.I.maintenances(k, self.I.encode([[x] if x != self.I.empty else [] for x in self.I.X]))[:, None], len(self.I.L), axis = 1)
+        else:
+            Q = (self.I.phi_batch(k) @ self.stored_r[k]).reshape(len(self.I.X), len(self.I.L))
 
-        return cost
+        return np.where(self.I.feasible, Q, np.inf)
 
-    def Qtilde(self, k, x, u):
+    def minimum(self, k):
         """
-            Compute the \tilde{Q}_k(x,u) value with the linear approximation
+            Retrieve the minimum \tilde{Q}_k(x,u) values over actions u for all states x, computing them only once
         """
 
-        y = [x] if x != self.I.empty else []
+        if k not in self.stored_Jtilde:
 
-        if k == self.I.N:
-            return self.I.m(k, y)
+            minimum = self.Qtilde_batch(k).min(axis = 1)
 
-        phi = self.I.phi(k, x, u)
+            self.stored_Jtilde[k] = { x : minimum[index] for index, x in enumerate(self.I.X) }
 
-        return np.dot(self.stored_r[k], phi)
+        return self.stored_Jtilde[k]
 
     def Jtilde(self, k, x):
         """
@@ -199,23 +262,8 @@ class Parametric:
 
                     print('\t\tAt state {}, take action {}'.format(x, self.stored_u[k][x]))
 
-                    transition = {}
-
-                    for x_next in self.I.X:
-
-                        transition[x_next] = .0
-
-                    for w in self.I.W[k]:
-
-                        y = [x] if x != self.I.empty else []
-
-                        y_next = self.I.f(y, self.stored_u[k][x], w)
-
-                        x_next = self.I.empty if len(y_next) == 0 else y_next[0]
-
-                        p = self.I.p(k, w, y)
-
-                        transition[x_next] += p
+                    # Retrieve next-state distribution from the expectation record
+                    transition = self.I.expectation(k, x, self.stored_u[k][x])['transition']
 
                     for x_next, p in transition.items():
 
@@ -234,9 +282,7 @@ class Parametric:
 
         print('Exporting parametric policy')
 
-        with open('policies/parametric_{}_{}_{}_{}.txt'.format(self.I.name, self.I.s, self.I.d, str(uuid.uuid4())[:8]),'w') as output:
-
-            output.write('{}'.format(self.stored_u))
+        st.Store().save('parametric', self.I, self.stored_u, stored_r = self.stored_r)
 
     def print_summary(self, k = 0):
         """
@@ -244,4 +290,7 @@ class Parametric:
         """
 
         for x in self.I.X:
-            print('\tThe expected profit Jtilde_{}({}) is {}'.format(k, x, self.Jtilde(k, x)))
\ No newline at end of file
+            print('\tThe expected profit Jtilde_{}({}) is {}'.format(k, x, self.Jtilde(k, x)))
+
+        if k != self.I.N:
+            print('\tThe probability mass dropped by pruning at stage {} is at most {}'.format(k, max([self.I.dropped(k, x) for x in self.I.X])))
\ No newline at end of file
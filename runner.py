@@ -0,0 +1,154 @@
+import concurrent.futures as cf
+import argparse as ag
+import numpy as np
+import instance as it
+import backward as bd
+import vectorized as vz
+import parametric as pd
+import cache as ch
+import time as tm
+import csv
+import os
+
+# Store instances loaded by the current process, keyed by folder
+loaded = {}
+
+# Store fields of every row of the results file
+fields = ['instance', 'd', 's', 'strategy', 'solver', 'repetition', 'seed', 'x', 'J', 'dropped', 'elapsed', 'tables']
+
+def load(folder, options):
+    """
+        Load the instance within some folder only once per process
+    """
+
+    if folder not in loaded:
+        loaded[folder] = it.Instance(folder, 0, 1, None, options['chunk'], 'uniform', options['threshold'], options['epsilon'], options['binary'])
+
+    return loaded[folder]
+
+def prepare(problem):
+    """
+        Build the distribution tables and expectation records that the solvers share
+    """
+
+    for k in problem.K:
+        if k != problem.N:
+            for x in problem.X:
+                # Tables are not built when streaming expectations
+                if problem.chunk == 0:
+                    problem.table(k, x)
+                problem.expectation(k, x, problem.empty)
+
+def run_group(folder, samples, strategy, repetition, seed, decays, solvers, options):
+    """
+        Run every solver for every decay on the instance within some folder with scenarios drawn
+        for the given number of samples, strategy, and repetition (returns rows of the results file)
+    """
+
+    problem = load(folder, options)
+    problem.strategy = strategy
+    problem.seed = seed
+
+    rows = []
+
+    for index, d in enumerate(decays):
+
+        # Set parameter d in the instance (tables are shared among the solvers)
+        problem.d = d
+
+        # Draw the scenarios of this group, which solvers share across decays
+        # (except for importance sampling, whose proposal depends on d and is drawn again for every decay)
+        if index == 0 or strategy == 'importance':
+            problem.generator = np.random.default_rng(seed)
+            problem.sample(samples)
+
+        # Build shared tables beforehand, so their time is not charged to the first solver
+        start = tm.time()
+        prepare(problem)
+        tables = tm.time() - start
+
+        for solver in solvers:
+
+            start = tm.time()
+
+            if solver == 'parametric':
+                method = pd.Parametric(problem)
+                method.train_solver()
+                method.run_solver(vectorized = True)
+                values = { x : method.Jtilde(0, x) for x in problem.X }
+            else:
+                method = vz.Vectorized(problem) if solver == 'vectorized' else bd.Backward(problem)
+                if options['cache']:
+                    ch.Cache().solve(solver, method)
+                else:
+                    method.run_solver()
+                values = { x : method.J(0, x) for x in problem.X }
+
+            elapsed = tm.time() - start
+
+            for x in problem.X:
+                rows.append([problem.name, d, problem.s, strategy, solver, repetition, seed, x, values[x], problem.dropped(0, x), elapsed, tables])
+
+    return rows
+
+# Guard the script so that worker processes can import it safely
+if __name__ == '__main__':
+
+    parser = ag.ArgumentParser(description = 'Run solvers over a grid of instances, decays, samples, strategies, and repetitions')
+    parser.add_argument('folders', type = str, nargs = '+', help = 'Paths to the folders with instance files')
+    parser.add_argument('-d', '--decays', type = float, nargs = '+', help = 'Set values of the rationality decay parameter', default = [1])
+    parser.add_argument('-s', '--samples', type = int, nargs = '+', help = 'Set numbers of samples (0 means full enumeration)', default = [0])
+    parser.add_argument('--strategies', type = str, nargs = '+', choices = ['uniform', 'stratified', 'importance'], help = 'Set sampling strategies for the scenarios (importance sweeps all 2^|L| scenarios per stage to build its proposal)', default = ['uniform'])
+    parser.add_argument('--solvers', type = str, nargs = '+', choices = ['backward', 'vectorized', 'parametric'], help = 'Set solvers to run', default = ['backward'])
+    parser.add_argument('--repetitions', type = int, help = 'Set number of repetitions of every sampled configuration', default = 1)
+    parser.add_argument('--seed', type = int, help = 'Set seed of the first repetition, the others using the next seeds (default is unseeded)', default = None)
+    parser.add_argument('--chunk', type = int, help = 'Set number of scenarios per chunk to stream expectations in bounded memory (0 means no streaming)', default = 0)
+    parser.add_argument('--threshold', type = float, help = 'Set probability under which scenarios are dropped from expectations', default = 0.0001)
+    parser.add_argument('--epsilon', type = float, help = 'Set probability mass that the most likely scenarios may leave out of expectations (0 means no limit)', default = 0)
+    parser.add_argument('--binary', action = 'store_true', help = 'Load instances from their binary form (created on the first run) instead of parsing their files', default = False)
+    parser.add_argument('--cache', action = 'store_true', help = 'Load backward solutions from the solution cache (or save them there)', default = False)
+    parser.add_argument('--workers', type = int, help = 'Set number of worker processes running groups of the grid', default = 1)
+    parser.add_argument('--output', type = str, help = 'Path to the results file', default = 'results.csv')
+    arguments = parser.parse_args()
+
+    # The vectorized solver keeps all scenarios of a stage in memory, so it cannot stream expectations
+    if 'vectorized' in arguments.solvers and arguments.chunk > 0:
+        parser.error('--chunk cannot be combined with the vectorized solver')
+
+    start_time = tm.time()
+
+    options = { 'chunk' : arguments.chunk, 'threshold' : arguments.threshold, 'epsilon' : arguments.epsilon, 'binary' : arguments.binary, 'cache' : arguments.cache }
+
+    # The parametric solver writes its training points in this folder
+    if 'parametric' in arguments.solvers and not os.path.isdir('training'):
+        os.makedirs('training')
+
+    # Create groups of the grid, where full enumeration needs a single repetition and strategy
+    groups = []
+    for folder in arguments.folders:
+        for samples in arguments.samples:
+            for strategy in (arguments.strategies if samples > 0 else ['uniform']):
+                for repetition in range(arguments.repetitions if samples > 0 else 1):
+                    seed = arguments.seed + repetition if arguments.seed is not None and samples > 0 else None
+                    groups.append((folder, samples, strategy, repetition, seed, arguments.decays, arguments.solvers, options))
+
+    print('Running {} groups of the grid'.format(len(groups)))
+
+    rows = []
+
+    if arguments.workers > 1:
+        # Spread groups over worker processes, which load every instance once
+        with cf.ProcessPoolExecutor(max_workers = arguments.workers) as pool:
+            for result in pool.map(run_group, *zip(*groups)):
+                rows.extend(result)
+    else:
+        for group in groups:
+            rows.extend(run_group(*group))
+
+    with open(arguments.output, 'w', newline = '') as output:
+        writer = csv.writer(output)
+        writer.writerow(fields)
+        writer.writerows(rows)
+
+    print('Writing {} rows to {}'.format(len(rows), arguments.output))
+    print('>>> Elapsed time within the runner: {} seconds'.format(round(tm.time() - start_time, 4)))
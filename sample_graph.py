@@ -1,95 +1,137 @@
+import concurrent.futures as cf
 import matplotlib.pyplot as plt
+import numpy as np
 import argparse as ag
 import instance as it
 import backward as bd
-import ast
-import os
-
-# Parse arguments using argparse
-parser = ag.ArgumentParser(description = 'Draw graph with varying values of the number of samples for some instance')
-parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
-parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples (0 means full enumeration)', default = 0)
-parser.add_argument('-d', '--decay', type = int, help = 'Set rationality decay parameter (1 means fully rational)', default = 1)
-arguments = parser.parse_args()
-
-# Create problem object with arguments
-problem = it.Instance(arguments.folder, arguments.samples, arguments.decay)
-
-# Create reference solver and run it
-reference = bd.Backward(problem)
-reference.run_solver()
-
-# Decide variation of the sample values
-if 'medium' in arguments.folder:
-    # For medium instance
-    sample_values = list(range(1,16))
-else:
-    # For large instance
-    sample_values = [10,20,30,40,50,60,70,80,90,100,120,140,160,180,200]
-
-
-# Create dictionary to store error
-error_J = {}
-
-# For each value of s, each time period k, and each state x...
-# There are either 100 runs (medium instance) or 10 runs (large instance)...
-# Store the list to later compute the average error
-for s in sample_values:
-    error_J[s] = {}
-    for k in problem.K:
-        error_J[s][k] = {}
-        for x in problem.X:
-            error_J[s][k][x] = []
-
-# Loop over values of parameter s
-for s in sample_values:
-
-    # Retrieve policies in the policy folder with current s (and global d)
-    policies = []
-    pattern = '{}_{}_{}_{}'.format('backward', problem.name, s, arguments.decay)
-    print('Looking for stored policies with pattern {}'.format(pattern))
-
-    # Retrieve the dictionary with the policy from the file using ast package
-    for file in os.listdir('policies'):
-        if pattern in file:
-            print('\tFound policy {}'.format(file))
-            with open('policies/{}'.format(file)) as output:
-                content = output.read()
-            policy = ast.literal_eval(content)
-            policies.append(policy)
-
-    # Loop over retrieved policies in the last step
-    for identifier, policy in enumerate(policies):
-
-        print('Evaluating policy #{}'.format(identifier))
-
-        # Compute the J_k(x) value according to policy
-        # Using the reference solver, "perfect" information
-        evaluated_J = reference.evaluate_policy(policy)
-
+import vectorized as vz
+import cache as ch
+import store as st
+
+def replicate(folder, sample_values, decay, seed):
+    """
+        Solve the instance within some folder for all values of s at once, using nested prefixes
+        of a single stream of scenarios drawn with some seed (returns the policy per value of s)
+    """
+
+    problem = it.Instance(folder, max(sample_values), decay, seed)
+    _, policies = vz.Vectorized(problem).run_samples(sample_values)
+
+    return policies
+
+# Guard the script so that worker processes can import it safely
+if __name__ == '__main__':
+
+    # Parse arguments using argparse
+    parser = ag.ArgumentParser(description = 'Draw graph with varying values of the number of samples for some instance')
+    parser.add_argument('folder', type = str, help = 'Path to the folder with instance files')
+    parser.add_argument('-s', '--samples', type = int, help = 'Set number of samples of the reference solution (0 means full enumeration)', default = 0)
+    parser.add_argument('--strategy', type = str, choices = ['uniform', 'stratified', 'importance'], help = 'Set sampling strategy of the stored policies to evaluate (default is uniform)', default = None)
+    parser.add_argument('-d', '--decay', type = int, help = 'Set rationality decay parameter (1 means fully rational)', default = 1)
+    parser.add_argument('--seed', type = int, help = 'Set seed of the random generator used for sampling (default is unseeded)', default = None)
+    parser.add_argument('--nested', type = int, help = 'Solve this number of replications with nested uniform scenario sets for all values of s instead of loading stored policies (0 means stored policies)', default = 0)
+    parser.add_argument('--workers', type = int, help = 'Set number of worker processes running the replications', default = 1)
+    parser.add_argument('--cache', action = 'store_true', help = 'Load the reference solution from the solution cache (or save it there)', default = False)
+    arguments = parser.parse_args()
+
+    # Nested scenario sets are prefixes of uniform samples, so no other strategy applies to them
+    if arguments.nested > 0 and arguments.strategy is not None:
+        parser.error('--strategy cannot be combined with --nested (nested scenario sets are always sampled uniformly)')
+    if arguments.strategy is None:
+        arguments.strategy = 'uniform'
+
+    # Create problem object with arguments
+    problem = it.Instance(arguments.folder, arguments.samples, arguments.decay, arguments.seed)
+
+    # Create reference solver and run it
+    reference = bd.Backward(problem)
+    if arguments.cache:
+        ch.Cache().solve('backward', reference)
+    else:
+        reference.run_solver()
+
+    # Decide variation of the sample values
+    if 'medium' in arguments.folder:
+        # For medium instance
+        sample_values = list(range(1,16))
+    else:
+        # For large instance
+        sample_values = [10,20,30,40,50,60,70,80,90,100,120,140,160,180,200]
+
+
+    # Create dictionary to store error
+    error_J = {}
+
+    # For each value of s, each time period k, and each state x...
+    # There are either 100 runs (medium instance) or 10 runs (large instance)...
+    # Store the list to later compute the average error
+    for s in sample_values:
+        error_J[s] = {}
         for k in problem.K:
+            error_J[s][k] = {}
             for x in problem.X:
-                # Compute the error of the policy based on the reference
-                error = evaluated_J[k][x] - reference.J(k, x)
-                error_J[s][k][x].append(error)
-
-# Report only for k = 0 and x = 0
-k = 0
-x = '0'
-
-# Compute average error over 100 runs (medium instance) or 10 runs (large instance)
-data = []
-for s in sample_values:
-    if len(error_J[s][k][x]) > 0:
-        avg = sum(error_J[s][k][x]) / len(error_J[s][k][x])
-        data.append(avg)
-
-# Plot averge error of J_0(0) values
-plt.plot(sample_values, data, '-x')
-# Set other graph settings
-plt.ylabel('Average sub-optimality of the J_0(0) value'.format(k, k))
-plt.xlabel('Number of samples s')
-plt.savefig('graphs/samples_{}_{}_{}.png'.format(problem.name, k, x))
-plt.close()
-
-print('Exported sample graph to {}'.format('graphs/samples_{}_{}_{}.png'.format(problem.name, k, x)))
\ No newline at end of file
+                error_J[s][k][x] = []
+
+    # Retrieve policies per value of s
+    policies = {}
+
+    if arguments.nested > 0:
+
+        # Draw every replication from an independent stream spawned from the seed
+        seeds = np.random.SeedSequence(arguments.seed).spawn(arguments.nested)
+        print('Solving {} replications with nested scenario sets'.format(arguments.nested))
+
+        for s in sample_values:
+            policies[s] = []
+
+        # Solve replications in parallel, each of them for all values of s at once
+        with cf.ProcessPoolExecutor(max_workers = arguments.workers) as pool:
+            for replicated in pool.map(replicate, *zip(*[(arguments.folder, sample_values, arguments.decay, seed) for seed in seeds])):
+                for s in sample_values:
+                    policies[s].append(replicated[s])
+
+    else:
+
+        for s in sample_values:
+
+            # Retrieve policies in the policy store with current s (and global d)
+            print('Looking for stored policies with keys {}'.format(('backward', problem.name, s, arguments.decay, arguments.strategy)))
+            policies[s] = st.Store().policies('backward', problem.name, s, arguments.decay, arguments.strategy)
+            print('\tFound {} policies'.format(len(policies[s])))
+
+    # Loop over values of parameter s
+    for s in sample_values:
+
+        print('Evaluating {} policies'.format(len(policies[s])))
+
+        # Compute the J_k(x) values according to all policies at once
+        # Using the reference solver, "perfect" information
+        evaluated_J = reference.evaluate_policies(policies[s])
+
+        for identifier, _ in enumerate(policies[s]):
+            for k in problem.K:
+                for index, x in enumerate(problem.X):
+                    # Compute the error of the policy based on the reference
+                    error = evaluated_J[identifier, k, index] - reference.J(k, x)
+                    error_J[s][k][x].append(error)
+
+    # Report only for k = 0 and x = 0
+    k = 0
+    x = '0'
+
+    # Compute average error over 100 runs (medium instance) or 10 runs (large instance)
+    data = []
+    for s in sample_values:
+        if len(error_J[s][k][x]) > 0:
+            avg = sum(error_J[s][k][x]) / len(error_J[s][k][x])
+            data.append(avg)
+
+    # Plot averge error of J_0(0) values
+    plt.plot(sample_values, data, '-x')
+    # Set other graph settings
+    plt.ylabel('Average sub-optimality of the J_0(0) value'.format(k, k))
+    plt.xlabel('Number of samples s')
+    plt.savefig('graphs/samples_{}_{}_{}.png'.format(problem.name, k, x))
+    plt.close()
+
+    print('Exported sample graph to {}'.format('graphs/samples_{}_{}_{}.png'.format(problem.name, k, x)))
@@ -0,0 +1,173 @@
+import statistics as ss
+import numpy as np
+
+class Simulator:
+
+    def __init__(self, instance, seed = None):
+        """
+            Create Simulator for some problem instance (seed None means fresh entropy)
+        """
+
+        # Store instance object
+        self.I = instance
+
+        # Create random generator for trajectories
+        self.generator = np.random.default_rng(seed)
+
+    def simulate(self, policy, trajectories = 10000, x = None, confidence = 0.95):
+        """
+            Estimate the cost of some policy (as stored by the solvers) from state x at stage 0 with many trajectories at once
+            (competitor scenarios are drawn from the softmax model, returns the mean cost and its confidence interval)
+        """
+
+        x = x if x is not None else self.I.empty
+
+        costs, ended = self.rollout(policy, trajectories, x)
+
+        mean = costs.mean()
+        error = costs.std(ddof = 1) / np.sqrt(trajectories) if trajectories > 1 else .0
+        width = ss.NormalDist().inv_cdf((1 + confidence) / 2) * error
+
+        return {
+            'mean': mean,
+            'error': error,
+            'lower': mean - width,
+            'upper': mean + width,
+            'trajectories': trajectories,
+            'ended': ended
+        }
+
+    def rollout(self, policy, trajectories, x):
+        """
+            Simulate trajectories from state x at stage 0 under some policy (returns the cost of every trajectory
+            and the number of trajectories ended early because no scenario was left for competitors)
+        """
+
+        # Encode feasible states as boolean vectors over L
+        encoded = np.array([self.I.encode([y] if y != self.I.empty else []) for y in self.I.X])
+        singletons = np.eye(len(self.I.L), dtype = bool)
+
+        # Store the state reached by taking every action (when competitors do not take it)
+        targets = np.array([self.I.states[u] for u in self.I.L])
+
+        # Store the state of every trajectory as a position over X
+        states = np.full(trajectories, self.I.states[x])
+        costs = np.zeros(trajectories)
+
+        # Store whether every trajectory goes on, since trajectories end when no scenario is left for competitors
+        # (the solvers then keep no probability mass, so nothing is paid or collected afterwards)
+        active = np.ones(trajectories, dtype = bool)
+
+        for k in self.I.K:
+
+            # Pay maintenance of the location held at stage k
+            costs += np.where(active, self.I.maintenances(k, encoded)[states], .0)
+
+            if k == self.I.N:
+                break
+
+            # Retrieve the action of every trajectory as a position over L
+            actions = np.array([self.I.index[policy[k][y]] for y in self.I.X])[states]
+
+            # Draw competitor scenarios per state, since their distribution depends on the location held
+            omega = np.zeros((trajectories, len(self.I.L)), dtype = bool)
+            for position, y in enumerate(self.I.X):
+                members = np.flatnonzero((states == position) & active)
+                if len(members) > 0:
+                    drawn = self.draw(k, y, len(members))
+                    if drawn is None:
+                        active[members] = False
+                    else:
+                        omega[members] = drawn
+
+            # Collect revenues of action u unless competitors take it, in which case go to the empty state
+            blocked = omega[np.arange(trajectories), actions]
+            costs -= np.where(blocked | ~active, .0, self.I.revenues(singletons[actions], omega))
+            states = np.where(blocked, self.I.states[self.I.empty], targets[actions])
+
+        return costs, trajectories - active.sum()
+
+    def draw(self, k, x_k, count):
+        """
+            Draw count competitor scenarios at stage k with location x_k from the softmax model, shape count x |L|
+            (when streaming expectations, scenarios are swept by chunks so memory is bounded by the chunk size,
+            returns None when every scenario has location x_k, as the distribution is then empty)
+        """
+
+        if self.I.chunk == 0:
+            table = self.I.table(k, x_k)
+            if len(table['ids']) == 0:
+                return None
+            drawn = self.generator.choice(table['ids'], size = count, p = table['probabilities'] / table['probabilities'].sum())
+            return self.I.S[k][drawn]
+
+        y_k = self.I.encode([x_k] if x_k != self.I.empty else [])
+
+        # Compute beta based on rationality decay parameter
+        beta = 1 / self.I.d ** k
+
+        def profitable(chunk):
+
+            omega, weights = chunk
+
+            # Filter realizations w that have location x_k as an element
+            if x_k != self.I.empty:
+                available = ~omega[:, self.I.index[x_k]]
+                omega, weights = omega[available], weights[available]
+
+            # Compute potential profits to pass to the softmax (shifted by the weights of the scenarios)
+            return omega, beta * (self.I.revenues(omega, y_k) - self.I.maintenances(k, omega)) + weights
+
+        # First sweep: compute the logarithm of the normalization constant of the softmax
+        normalization = -np.inf
+
+        for _, profits in map(profitable, self.I.chunks(k)):
+            if len(profits) > 0:
+                normalization = np.logaddexp(normalization, np.logaddexp.reduce(profits))
+
+        # Second sweep: invert the cumulative distribution for sorted uniform draws
+        uniforms = self.generator.random(count)
+        order = np.argsort(uniforms)
+        uniforms = uniforms[order]
+
+        drawn = np.zeros((count, len(self.I.L)), dtype = bool)
+        cumulative = .0
+        found = 0
+        final = None
+
+        for omega, profits in map(profitable, self.I.chunks(k)):
+
+            if len(profits) == 0:
+                continue
+
+            bounds = cumulative + np.cumsum(np.exp(profits - normalization))
+
+            # Assign the draws falling within this chunk to their trajectories
+            last = np.searchsorted(uniforms, bounds[-1])
+            positions = np.minimum(np.searchsorted(bounds, uniforms[found:last], side = 'right'), len(omega) - 1)
+            drawn[order[found:last]] = omega[positions]
+
+            cumulative = bounds[-1]
+            found = last
+            final = omega[-1]
+
+        if final is None:
+            return None
+
+        # The last scenario takes any rounding leftovers
+        drawn[order[found:]] = final
+
+        return drawn
+
+    def print_summary(self, policy, trajectories = 10000, confidence = 0.95):
+        """
+            Print the estimated cost of some policy from every state x at stage 0
+        """
+
+        print('Simulating {} trajectories per state'.format(trajectories))
+
+        for x in self.I.X:
+            simulated = self.simulate(policy, trajectories, x, confidence)
+            print('\tThe simulated profit J_0({}) is {} ({}% confidence interval [{}, {}])'.format(x, simulated['mean'], round(100 * confidence), simulated['lower'], simulated['upper']))
+            if simulated['ended'] > 0:
+                print('\t\t{} trajectories ended early because every sampled scenario had the location held'.format(simulated['ended']))
@@ -0,0 +1,124 @@
+import numpy as np
+import uuid
+import csv
+import os
+
+class Store:
+
+    def __init__(self, folder = 'policies'):
+        """
+            Create policy store within some folder
+        """
+
+        # Store folder with policy files and path of their index file
+        self.folder = folder
+        self.index_path = os.path.join(folder, 'index.csv')
+        # Store fields that key every policy in the index file
+        self.fields = ['solver', 'instance', 's', 'd', 'strategy', 'run', 'file']
+
+    def encode(self, instance, stored_u, stored_J = None, stored_r = None):
+        """
+            Encode policy stored_u (along with stored_J or stored_r values) into arrays
+        """
+
+        # Encode actions as positions over L, shape |K| x |X| (-1 means no action)
+        arrays = {
+            'X': np.array(instance.X),
+            'L': np.array(instance.L),
+            'u': np.array([[instance.index[stored_u[k][x]] if stored_u[k][x] != -1 else -1 for x in instance.X] for k in instance.K], dtype = np.int16)
+        }
+
+        # Encode J_k(x) values, shape |K| x |X|
+        if stored_J is not None:
+            arrays['J'] = np.array([[stored_J[k][x] for x in instance.X] for k in instance.K], dtype = float)
+
+        # Encode r_k coefficients, shape N x features
+        if stored_r is not None:
+            arrays['r'] = np.array([stored_r[k] for k in instance.K if k != instance.N], dtype = float)
+
+        return arrays
+
+    def decode(self, content):
+        """
+            Decode arrays of some policy file into the dictionary format used by the solvers
+        """
+
+        X = [str(x) for x in content['X']]
+        L = [str(i) for i in content['L']]
+
+        loaded = {}
+
+        # Decode actions into the dictionary format used by the solvers
+        loaded['u'] = { k : { x : L[u] if u != -1 else -1 for x, u in zip(X, row) } for k, row in enumerate(content['u']) }
+
+        if 'J' in content:
+            loaded['J'] = { k : { x : J for x, J in zip(X, row) } for k, row in enumerate(content['J']) }
+
+        if 'r' in content:
+            loaded['r'] = { k : r for k, r in enumerate(content['r']) }
+
+        return loaded
+
+    def save(self, solver, instance, stored_u, stored_J = None, stored_r = None):
+        """
+            Save policy stored_u (along with stored_J or stored_r values) found by some solver for some instance
+        """
+
+        run = str(uuid.uuid4())[:8]
+        file = '{}_{}_{}_{}_{}_{}.npz'.format(solver, instance.name, instance.s, instance.d, instance.strategy, run)
+
+        arrays = self.encode(instance, stored_u, stored_J, stored_r)
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+        np.savez(os.path.join(self.folder, file), **arrays)
+
+        # Append the policy to the index file
+        exists = os.path.exists(self.index_path)
+        with open(self.index_path, 'a', newline = '') as output:
+            writer = csv.writer(output)
+            if not exists:
+                writer.writerow(self.fields)
+            writer.writerow([solver, instance.name, instance.s, instance.d, instance.strategy, run, file])
+
+        return run
+
+    def entries(self, solver = None, instance = None, s = None, d = None, strategy = None):
+        """
+            List the entries of the index file that match the keys provided as arguments (None matches anything)
+        """
+
+        if not os.path.exists(self.index_path):
+            return []
+
+        with open(self.index_path, newline = '') as content:
+            entries = list(csv.DictReader(content))
+
+        if solver is not None:
+            entries = [e for e in entries if e['solver'] == solver]
+        if instance is not None:
+            entries = [e for e in entries if e['instance'] == instance]
+        if s is not None:
+            entries = [e for e in entries if int(e['s']) == int(s)]
+        if d is not None:
+            entries = [e for e in entries if float(e['d']) == float(d)]
+        if strategy is not None:
+            entries = [e for e in entries if e['strategy'] == strategy]
+
+        return entries
+
+    def load(self, entry):
+        """
+            Load the policy of some entry of the index file (along with its J_k(x) values or r_k coefficients)
+        """
+
+        with np.load(os.path.join(self.folder, entry['file'])) as content:
+            return self.decode(content)
+
+    def policies(self, solver = None, instance = None, s = None, d = None, strategy = None):
+        """
+            Load all policies that match the keys provided as arguments
+        """
+
+        return [self.load(entry)['u'] for entry in self.entries(solver, instance, s, d, strategy)]
@@ -0,0 +1,236 @@
+import backward as bd
+import numpy as np
+
+class Vectorized(bd.Backward):
+
+    def __init__(self, instance):
+        """
+            Create Vectorized solver for some problem instance
+        """
+
+        super().__init__(instance)
+
+    def run_solver(self, verbose = False):
+        """
+            Solve the problem instance with Vectorized solver (i.e., Backward solver with array operations)
+        """
+
+        # Stage probabilities are built from in-memory tables, which prune differently from streamed expectations
+        if self.I.chunk > 0:
+            raise Exception('Vectorized solver error: expectations cannot be streamed, set chunk to 0 instead of {}'.format(self.I.chunk))
+
+        print('Running vectorized backward solver')
+
+        # Index states and actions over positions of X and L
+        states = np.arange(len(self.I.X))
+        actions = np.arange(len(self.I.L))
+
+        # Encode feasible states as boolean vectors over L
+        encoded = np.array([self.I.encode([x] if x != self.I.empty else []) for x in self.I.X])
+
+        # Mask infeasible actions (i.e., action u is the same as state x)
+        infeasible = encoded
+
+        # Loop over planning stages
+        for k in reversed(self.I.K):
+
+            self.stored_J[k] = {}
+            self.stored_u[k] = {}
+
+            if verbose:
+                print('\tStage {}'.format(k))
+
+            # Compute deterministic term for all states x at once
+            maintenance = self.I.maintenances(k, encoded)
+
+            if k == self.I.N:
+
+                # Compute g_N(x) if at stage k = N
+                for x in states:
+                    self.stored_J[k][self.I.X[x]] = maintenance[x]
+                    self.stored_u[k][self.I.X[x]] = -1
+
+                continue
+
+            omega = self.I.S[k]
+
+            # Build probabilities of realizations w for all states x, shape |X| x 1 x |W|
+            # (realizations w out of the support are discarded as in the Backward solver)
+            probabilities = np.zeros((len(self.I.X), 1, len(omega)))
+            for x in states:
+                table = self.I.table(k, self.I.X[x])
+                probabilities[x, 0, table['support']] = table['weights']
+
+            # Build transition targets for all actions u, shape 1 x |L| x |W|
+            # (the company goes to location u unless competitors take it, in which case it goes to the empty state)
+            blocked = omega.T[None, :, :]
+            targets = np.where(blocked, 0, actions[None, :, None] + 1)
+
+            # Build revenues for all actions u, shape 1 x |L| x |W|
+            revenues = np.where(blocked, .0, self.I.revenues(np.eye(len(self.I.L), dtype = bool)[:, None, :], omega[None, :, :]))
+
+            # Gather J_{k+1} values of the transition targets at once
+            following = np.array([self.stored_J[k + 1][x] for x in self.I.X])[targets]
+
+            # Compute Q_k(x,u) for all states x and actions u, shape |X| x |L|
+            Q = maintenance[:, None] + (probabilities * (following - revenues)).sum(axis = 2)
+            Q = np.where(infeasible, np.inf, Q)
+
+            # Take the minimum over feasible actions for all states x at once
+            optimal = Q.argmin(axis = 1)
+
+            for x in states:
+
+                if verbose:
+                    print('\t\tState {} -> action {} with Q_{}({}, {}) = {}'.format(self.I.X[x], self.I.L[optimal[x]], k, self.I.X[x], self.I.L[optimal[x]], round(Q[x, optimal[x]], 2)))
+
+                self.stored_J[k][self.I.X[x]] = Q[x, optimal[x]]
+                self.stored_u[k][self.I.X[x]] = self.I.L[optimal[x]]
+
+    def run_decays(self, decays, verbose = False):
+        """
+            Solve the problem instance for several values of the rationality decay parameter at once
+            (potential profits are computed once and a decay axis is carried through the computations,
+            returns J_k(x) values and policies per value of d, in the format of stored_J and stored_u)
+        """
+
+        print('Running vectorized backward solver for {} values of d'.format(len(decays)))
+
+        def distributions(k, x_k):
+
+            ids, profits = self.I.candidates(k, x_k)
+
+            # Compute beta for all values of d, shape |D| x 1
+            beta = 1 / np.array(decays, dtype = float)[:, None] ** k
+
+            # Compute the softmax for all values of d at once, shape |D| x |W|
+            profits = beta * profits[None, :] + self.I.weights(k, ids)[None, :]
+
+            return ids, np.exp(profits - np.logaddexp.reduce(profits, axis = 1, keepdims = True))
+
+        return self.run_axis(decays, distributions, verbose)
+
+    def run_samples(self, sizes, verbose = False):
+        """
+            Solve the problem instance for several numbers of samples at once, using the first s scenarios of every stage
+            (scenarios drawn uniformly without replacement are in random order, so their prefixes are nested samples,
+            returns J_k(x) values and policies per value of s, in the format of stored_J and stored_u)
+        """
+
+        # Only uniform samples are in random order (stratified samples are grouped by size, importance samples by code)
+        if self.I.strategy != 'uniform':
+            raise Exception('Vectorized solver error: nested samples require the uniform strategy, not {}'.format(self.I.strategy))
+
+        print('Running vectorized backward solver for {} values of s'.format(len(sizes)))
+
+        def distributions(k, x_k):
+
+            ids, profits = self.I.candidates(k, x_k)
+
+            # Compute beta based on rationality decay parameter
+            beta = 1 / self.I.d ** k
+
+            # Compute the normalization constant of the softmax for all prefixes in a single running log-sum-exp
+            profits = beta * profits + self.I.weights(k, ids)
+            normalization = np.logaddexp.accumulate(profits) if len(profits) > 0 else profits
+
+            # Compute the softmax over the first s scenarios for all values of s, shape |S| x |W|
+            probabilities = np.zeros((len(sizes), len(ids)))
+            for row, size in enumerate(sizes):
+                count = np.searchsorted(ids, size)
+                if count > 0:
+                    probabilities[row, :count] = np.exp(profits[:count] - normalization[count - 1])
+
+            return ids, probabilities
+
+        return self.run_axis(sizes, distributions, verbose)
+
+    def run_axis(self, labels, distributions, verbose = False):
+        """
+            Solve the problem instance for several variants at once, carrying a leading axis through the computations
+            (distributions(k, x_k) returns realizations w and their probabilities per variant, shape |V| x |W|,
+            returns J_k(x) values and policies per variant label, in the format of stored_J and stored_u)
+        """
+
+        # Store J_k(x) values and policies per variant
+        varied_J = { label : {} for label in labels }
+        varied_u = { label : {} for label in labels }
+
+        # Index states and actions over positions of X and L
+        states = np.arange(len(self.I.X))
+        actions = np.array([self.I.states[u] for u in self.I.L])
+        empty = self.I.states[self.I.empty]
+
+        # Encode feasible states as boolean vectors over L
+        encoded = np.array([self.I.encode([x] if x != self.I.empty else []) for x in self.I.X])
+
+        # Mask infeasible actions (i.e., action u is the same as state x)
+        infeasible = encoded
+
+        # Store J_{k+1} values for all variants and states x, shape |V| x |X|
+        following = None
+
+        # Loop over planning stages
+        for k in reversed(self.I.K):
+
+            if verbose:
+                print('\tStage {}'.format(k))
+
+            # Compute deterministic term for all states x at once
+            maintenance = self.I.maintenances(k, encoded)
+
+            if k == self.I.N:
+
+                # Compute g_N(x) if at stage k = N for all variants
+                following = np.tile(maintenance, (len(labels), 1))
+                optimal = None
+
+            else:
+
+                # Store the mass kept, the probabilities that every location is included in w,
+                # and the expected revenues of every action u, for all variants and states x
+                kept = np.zeros((len(labels), len(self.I.X)))
+                included = np.zeros((len(labels), len(self.I.X), len(self.I.L)))
+                revenue = np.zeros((len(labels), len(self.I.X), len(self.I.L)))
+
+                for x in states:
+
+                    ids, probabilities = distributions(k, self.I.X[x])
+
+                    if len(ids) == 0:
+                        continue
+
+                    # Discard realizations w out of the support as in the Backward solver
+                    support = np.array([self.I.prune(row) for row in probabilities])
+                    p = np.where(support, probabilities, .0)
+
+                    # Keep only realizations w within the support of some variant
+                    union = support.any(axis = 0)
+                    p = p[:, union]
+
+                    omega = self.I.S[k][ids[union]]
+                    best = self.I.leading(omega)
+
+                    kept[:, x] = p.sum(axis = 1)
+                    included[:, x] = p @ omega
+                    # Accumulate histograms of best competitor ranks over the support of every variant only
+                    ranked = np.array([self.I.histogram(row[row > 0], best[row > 0]) for row in p])
+                    revenue[:, x] = self.I.expected_revenues(ranked)
+
+                # Compute Q_k(x,u) for all variants, states x, and actions u, shape |V| x |X| x |L|
+                # (the company goes to location u unless competitors take it, in which case it goes to the empty state)
+                Q = maintenance[None, :, None] - revenue
+                Q += included * following[:, empty, None, None]
+                Q += (kept[:, :, None] - included) * following[:, None, actions]
+                Q = np.where(infeasible[None, :, :], np.inf, Q)
+
+                # Take the minimum over feasible actions for all variants and states x at once
+                optimal = Q.argmin(axis = 2)
+                following = np.take_along_axis(Q, optimal[:, :, None], axis = 2)[:, :, 0]
+
+            for index, label in enumerate(labels):
+
+                varied_J[label][k] = { self.I.X[x] : following[index, x] for x in states }
+                varied_u[label][k] = { self.I.X[x] : self.I.L[optimal[index, x]] if optimal is not None else -1 for x in states }
+
+        return varied_J, varied_u